@@ -1,21 +1,37 @@
-from typing import List
+import csv
+import io
+from datetime import date, datetime
+from enum import Enum
+from typing import Iterator, Literal, Optional
 from uuid import UUID
 
+import orjson
+
 from fastapi import APIRouter, Depends, HTTPException, Path, Query, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 
-from app.deps import get_current_user , get_db
-from app.models import User, UserCreate, UserUpdate
+from app.config import settings
+from app.db import engine, serialized_write
+from app.crud import get_user_by_email
+from app.deps import get_async_db, get_current_user , invalidate_cached_user
+from app.pagination import decode_cursor, page_size, paginate
+from app.responses import ORJSONResponse
+from app.models import (
+    BookingRead, BookingStatus, User, UserCreate, UserCreated, UserList, UserPublic, UserUpdate, Waste, WasteType, read_columns,
+)
 
 from sqlalchemy.orm import registry
-from fastapi.encoders import jsonable_encoder
 
-from app.utils import get_password_hash
+from app.geocoding import haversine_km, within_clause
+from app.passwords import password_hasher
+from app.profiling import profile_buffer
+from app.scheduling import Stop, plan_routes
 from sqlalchemy.exc import IntegrityError
 
-from fastapi.encoders import jsonable_encoder
-from fastapi.responses import JSONResponse
 
 
 mapper_registry = registry()
@@ -30,47 +46,55 @@ async def hello():
 
 @router.get(
     "/users/",
-    response_model=List[User],
+    response_model=UserList,
     summary="Get a list of users.",
     response_description="List of users retrieved successfully.",
 )
 async def read_users(
     current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_db),
-    skip: int = Query(0, ge=0),
-    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db),
+    cursor: str | None = Query(None, description="next_cursor from the previous page"),
+    limit: int = Depends(page_size),
 ):
     """
-    Retrieve a list of users.
+    Retrieve a list of users, ordered by id.
 
     Args:
         current_user (User, optional): The current authenticated user.
-        session (Session, optional): The database session.
-        skip (int, optional): Number of records to skip. Defaults to 0.
-        limit (int, optional): Maximum number of records to return. Defaults to 10.
+        db (AsyncSession, optional): The database session.
+        cursor (str, optional): The next_cursor of the previous page. Defaults to the first page.
+        limit (int, optional): Maximum number of records to return. Defaults to PAGE_SIZE_DEFAULT.
 
     Returns:
-        List[User]: List of users retrieved successfully.
+        dict: The users of this page and the next_cursor, which is null on the last page.
     """
     if not current_user.is_staff:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only staff members can access this route.",
         )
-    users = session.exec(select(User).offset(skip).limit(limit)).all()
-    users= jsonable_encoder(users)
-    return JSONResponse(
+    statement = select(*read_columns(UserPublic, User)).order_by(User.id).limit(limit + 1)
+    after = decode_cursor(cursor)
+    if after is not None:
+        try:
+            statement = statement.where(User.id > UUID(after["id"]))
+        except (KeyError, TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    users = (await db.exec(statement)).all()
+    users, next_cursor = paginate(users, limit, lambda row: {"id": row.id})
+    return ORJSONResponse(
     status_code=200,
     content={
         "message": "list of users",
-        "users":users
+        "users": [UserPublic.model_validate(row) for row in users],
+        "next_cursor": next_cursor,
     })
     
 
 
 @router.post(
     "/users/",
-    response_model=User,
+    response_model=UserCreated,
     status_code =201,
     summary="Create a new user.",
     response_description="User created successfully.",
@@ -78,7 +102,7 @@ async def read_users(
 async def create_user(
     user: UserCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Create a new user.
@@ -86,10 +110,10 @@ async def create_user(
     Args:
         user_create (UserCreate): Details of the user to be created.
         current_user (User, optional): The current authenticated user.
-        session (Session, optional): The database session.
+        db (AsyncSession, optional): The database session.
 
     Returns:
-        User: User created successfully.
+        dict: The created user and a message.
     """
     if not current_user.is_staff:
         raise HTTPException(
@@ -97,29 +121,31 @@ async def create_user(
             detail="Only staff members can access this route.",
         )
     
-    db_email =db.query(User).filter(User.email ==user.email).first()
+    db_email = await get_user_by_email(session=db, email=user.email)
     
     if db_email is not None:
-        return  HTTPException(status_code = status.HTTP_400_BAD_REQUEST, 
+        raise  HTTPException(status_code = status.HTTP_400_BAD_REQUEST, 
             detail="User with the email already exists"
         )
     
-    db_username =db.query(User).filter(User.first_name == user.first_name and User.last_name == user.last_name).first()
+    statement = select(User.id).where(User.first_name == user.first_name, User.last_name == user.last_name)
+    db_username = (await db.exec(statement)).first()
       
     if db_username is not None:
-        return  HTTPException(status_code = status.HTTP_400_BAD_REQUEST, 
-            detail="User with the email already exists"
+        raise  HTTPException(status_code = status.HTTP_400_BAD_REQUEST, 
+            detail="User with the same name already exists"
         )
             
     
+    #hash the password; a full hash pool answers 429, so keep it outside the try below
+    user.password = await password_hasher.hash(user.password)
+
     try:
-        #hash the password 
-        user.password = get_password_hash(user.password)
-        
         new_user =User(**user.model_dump())
-        db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
+        async with serialized_write():
+            db.add(new_user)
+            await db.commit()
+        await db.refresh(new_user)
         
         
     # except IntegrityError as e:
@@ -129,21 +155,20 @@ async def create_user(
         error_message = "An error occurred while creating the user."    
         raise HTTPException(status_code=500, detail=error_message)
     # return { status_code= "message": "User created successfully"}
-    new_user =jsonable_encoder(new_user)
-    return JSONResponse(status_code =201, content={"data": new_user , "message": "user created successfully"})
+    return ORJSONResponse(status_code =201, content={"data": UserPublic.model_validate(new_user), "message": "user created successfully"})
 
 
 @router.get(
-    "/users/{user_id }",
+    "/users/{user_id}",
     status_code=200,
-    response_model=User,
+    response_model=UserPublic,
     summary="Get user by ID.",
     response_description="User retrieved successfully.",
 )
 async def read_user_by_id(
-    user_id: str= Path(..., title="The UUID of the user."),
+    user_id: UUID = Path(..., title="The UUID of the user."),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Retrieve a user by ID.
@@ -151,7 +176,7 @@ async def read_user_by_id(
     Args:
         user_id (UUID): The UUID of the user to retrieve.
         current_user (User, optional): The current authenticated user.
-        session (Session, optional): The database session.
+        db (AsyncSession, optional): The database session.
 
     Returns:
         User: User retrieved successfully.
@@ -162,7 +187,8 @@ async def read_user_by_id(
             detail="Only staff members can access this route.",
         )
     
-    user = db.get(User, user_id)
+    statement = select(*read_columns(UserPublic, User)).where(User.id == user_id)
+    user = (await db.exec(statement)).first()
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -173,7 +199,7 @@ async def read_user_by_id(
 
 @router.put(
     "/users/{user_id}",
-    response_model=User,
+    response_model=UserPublic,
     summary="Update user by ID.",
     response_description="User updated successfully.",
 )
@@ -181,7 +207,7 @@ async def update_user(
     user_update:UserUpdate,
     user_id: UUID = Path(..., title="The UUID of the user."),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Update a user by ID.
@@ -190,7 +216,7 @@ async def update_user(
         user_id (UUID): The UUID of the user to update.
         user_update (UserUpdate): Details of the user to update.
         current_user (User, optional): The current authenticated user.
-        session (Session, optional): The database session.
+        db (AsyncSession, optional): The database session.
 
     Returns:
         User: User updated successfully.
@@ -200,7 +226,7 @@ async def update_user(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only staff members can access this route.",
         )
-    user = db.get(User, user_id)
+    user = await db.get(User, user_id)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -208,8 +234,10 @@ async def update_user(
         )
     for field, value in user_update.dict().items():
         setattr(user, field, value)
-    db.commit()
-    db.refresh(user)
+    async with serialized_write():
+        await db.commit()
+    invalidate_cached_user(user.id)
+    await db.refresh(user)
     return user
 
 
@@ -221,7 +249,7 @@ async def update_user(
 async def delete_user(
     user_id: UUID = Path(..., title="The UUID of the user."),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Delete a user by ID.
@@ -229,7 +257,7 @@ async def delete_user(
     Args:
         user_id (UUID): The UUID of the user to delete.
         current_user (User, optional): The current authenticated user.
-        session (Session, optional): The database session.
+        db (AsyncSession, optional): The database session.
 
     Returns:
         dict: Message indicating user deletion.
@@ -239,18 +267,282 @@ async def delete_user(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only staff members can access this route.",
         )
-    user = db.get(User, user_id)
+    user = await db.get(User, user_id)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found.",
         )
-    db.delete(user)
-    db.commit()
+    async with serialized_write():
+        await db.delete(user)
+        await db.commit()
+    invalidate_cached_user(user.id)
     return {"message": "User deleted successfully."}
 
 
 
 @router.on_event("startup")
 async def startup_event():
-    mapper_registry.configure()
\ No newline at end of file
+    mapper_registry.configure()
+
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+def export_bookings(statement, export_format: str) -> Iterator[bytes]:
+    """Yield the rows of ``statement`` as CSV or NDJSON, EXPORT_BATCH_SIZE rows at a time.
+
+    The request's session is closed before a streaming body is sent, so this
+    opens its own. yield_per keeps memory flat: only one batch is held at a
+    time, and on Postgres the rows come from a server-side cursor.
+    """
+    columns = list(BookingRead.model_fields)
+    with Session(engine) as session:
+        rows = session.execute(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        if export_format == "ndjson":
+            buffer = bytearray()
+            for row in rows:
+                buffer += orjson.dumps(row._asdict())
+                buffer += b"\n"
+                if len(buffer) >= EXPORT_CHUNK_BYTES:
+                    yield bytes(buffer)
+                    buffer.clear()
+            yield bytes(buffer)
+            return
+        text = io.StringIO()
+        writer = csv.writer(text)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow([_csv_value(value) for value in row])
+            if text.tell() >= EXPORT_CHUNK_BYTES:
+                yield text.getvalue().encode()
+                text.seek(0)
+                text.truncate()
+        yield text.getvalue().encode()
+
+
+@router.get(
+    "/bookings/export",
+    summary="Export bookings as CSV or NDJSON.",
+    response_description="The matching bookings, streamed.",
+)
+async def export_bookings_route(
+    current_user: User = Depends(get_current_user),
+    export_format: Literal["csv", "ndjson"] = Query("csv", alias="format"),
+    date_from: Optional[date] = Query(None, description="Earliest pickup date, inclusive."),
+    date_to: Optional[date] = Query(None, description="Latest pickup date, inclusive."),
+    waste_type: Optional[WasteType] = Query(None),
+    order_status: Optional[BookingStatus] = Query(None),
+):
+    """
+    Stream every booking matching the filters, ordered by id.
+
+    Args:
+        current_user (User, optional): The current authenticated user.
+        export_format (str, optional): "csv" (default) or "ndjson".
+        date_from (date, optional): Only bookings picked up on or after this date.
+        date_to (date, optional): Only bookings picked up on or before this date.
+        waste_type (WasteType, optional): Only bookings of this waste type.
+        order_status (BookingStatus, optional): Only bookings with this status.
+
+    Returns:
+        StreamingResponse: The bookings as a file download.
+    """
+    if not current_user.is_staff:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only staff members can access this route.",
+        )
+    statement = select(*read_columns(BookingRead, Waste)).order_by(Waste.id)
+    if date_from is not None:
+        statement = statement.where(Waste.pickup_date >= date_from)
+    if date_to is not None:
+        statement = statement.where(Waste.pickup_date <= date_to)
+    if waste_type is not None:
+        statement = statement.where(Waste.waste_type == waste_type)
+    if order_status is not None:
+        statement = statement.where(Waste.order_status == order_status)
+
+    media_type = "application/x-ndjson" if export_format == "ndjson" else "text/csv"
+    filename = f"bookings-{datetime.utcnow():%Y%m%d%H%M%S}.{export_format}"
+    return StreamingResponse(
+        export_bookings(statement, export_format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get(
+    "/schedule",
+    summary="Plan pickup routes for a day.",
+    response_description="Ordered pickup routes, one per vehicle.",
+)
+async def schedule_pickups(
+    day: date = Query(..., description="The pickup date to plan."),
+    capacity: int = Query(settings.SCHEDULE_VEHICLE_CAPACITY, ge=1, le=1000, description="Most stops per vehicle."),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Group the day's PENDING bookings by area and waste type and order them into vehicle routes.
+
+    Args:
+        day (date): The pickup date to plan.
+        capacity (int, optional): Most stops per vehicle. Defaults to SCHEDULE_VEHICLE_CAPACITY.
+        current_user (User, optional): The current authenticated user.
+        db (AsyncSession, optional): The database session.
+
+    Returns:
+        dict: The routes; each lists its booking ids in visiting order.
+    """
+    if not current_user.is_staff:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only staff members can access this route.",
+        )
+    statement = (
+        select(Waste.id, Waste.address, Waste.waste_type, Waste.latitude, Waste.longitude)
+        .where(Waste.order_status == BookingStatus.pending)
+        .where(Waste.pickup_date == day)
+    )
+    stops = [
+        Stop(row.id, row.address, row.waste_type.value, row.latitude, row.longitude)
+        for row in (await db.exec(statement)).all()
+    ]
+    depot = None
+    if settings.SCHEDULE_DEPOT_LATITUDE is not None and settings.SCHEDULE_DEPOT_LONGITUDE is not None:
+        depot = (settings.SCHEDULE_DEPOT_LATITUDE, settings.SCHEDULE_DEPOT_LONGITUDE)
+    # CPU-bound, so keep it off the event loop
+    routes = await run_in_threadpool(plan_routes, stops, capacity, depot)
+    return ORJSONResponse(
+        content={
+            "day": day,
+            "bookings": len(stops),
+            "vehicles": len(routes),
+            "routes": routes,
+        })
+
+
+@router.get(
+    "/bookings/nearby",
+    summary="Bookings within a distance of a point.",
+    response_description="Matching bookings, nearest first.",
+)
+async def bookings_nearby(
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(5, gt=0, le=100, description="Search radius in kilometres."),
+    order_status: Optional[BookingStatus] = Query(None),
+    limit: int = Depends(page_size),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Find geocoded bookings within radius_km of a point, nearest first.
+
+    Args:
+        latitude (float): Latitude of the point.
+        longitude (float): Longitude of the point.
+        radius_km (float, optional): Search radius in kilometres. Defaults to 5.
+        order_status (BookingStatus, optional): Only bookings with this status.
+        limit (int, optional): Maximum number of bookings to return.
+        current_user (User, optional): The current authenticated user.
+        db (AsyncSession, optional): The database session.
+
+    Returns:
+        dict: The bookings, each with its distance_km.
+    """
+    if not current_user.is_staff:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only staff members can access this route.",
+        )
+    # the geohash cells narrow it down through the index, haversine makes it exact
+    statement = select(*read_columns(BookingRead, Waste)).where(within_clause(latitude, longitude, radius_km))
+    if order_status is not None:
+        statement = statement.where(Waste.order_status == order_status)
+    matches = []
+    for row in (await db.exec(statement)).all():
+        distance = haversine_km((latitude, longitude), (row.latitude, row.longitude))
+        if distance <= radius_km:
+            matches.append((distance, row))
+    matches.sort(key=lambda match: match[0])
+    return ORJSONResponse(
+        content={
+            "bookings": [
+                {**BookingRead.model_validate(row).model_dump(), "distance_km": round(distance, 3)}
+                for distance, row in matches[:limit]
+            ],
+        })
+
+
+@router.get(
+    "/profiles",
+    summary="List captured request profiles.",
+    response_description="Captured profiles, newest first.",
+)
+async def list_profiles(current_user: User = Depends(get_current_user)):
+    """
+    List the request profiles held in memory by app.profiling, newest first.
+
+    Args:
+        current_user (User, optional): The current authenticated user.
+
+    Returns:
+        dict: A summary of each profile; download one by its id.
+    """
+    if not current_user.is_staff:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only staff members can access this route.",
+        )
+    return ORJSONResponse(content={"profiles": [profile.summary() for profile in profile_buffer.list()]})
+
+
+@router.get(
+    "/profiles/{profile_id}",
+    summary="Download a captured request profile.",
+    response_description="The profile as a .prof file or as text.",
+)
+async def download_profile(
+    profile_id: int,
+    profile_format: Literal["prof", "text"] = Query("prof", alias="format"),
+    sort: Literal["cumulative", "tottime", "calls"] = Query("cumulative"),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Download one profile, as a .prof file for pstats/snakeviz or as a text report.
+
+    Args:
+        profile_id (int): Id of the profile, from the list route or the X-Profile-Id header.
+        profile_format (str, optional): "prof" (default) or "text".
+        sort (str, optional): Sort order of the text report. Defaults to "cumulative".
+        current_user (User, optional): The current authenticated user.
+
+    Returns:
+        Response: The profile as a file download.
+    """
+    if not current_user.is_staff:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only staff members can access this route.",
+        )
+    profile = profile_buffer.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found, it may have been dropped from the buffer.")
+    if profile_format == "text":
+        return PlainTextResponse(await run_in_threadpool(profile.text, 40, sort))
+    return Response(
+        content=profile.dump(),
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile.id}.prof"'},
+    )
@@ -1,23 +1,24 @@
 from fastapi import APIRouter, status
 from fastapi import APIRouter, Depends, HTTPException
 
-from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from typing import List
 
-from app.deps import get_db
+from app.deps import get_async_db, invalidate_cached_user
 from app.models import NewPassword,Message
 
 from app.models import ForgetPasswordRequest, ResetForgetPassword
 from fastapi import BackgroundTasks
 
 from app.utils import (
-    send_email,
     verify_token,
-    get_password_hash,
     create_token,
     generate_reset_password_email
 )
 from app.crud import get_user_by_email
+from app.passwords import password_hasher
+from app.mailer import enqueue_email
+from app.db import serialized_write
 from fastapi_mail import FastMail, MessageSchema, MessageType
 from starlette.responses import JSONResponse
 
@@ -28,14 +29,14 @@ router=APIRouter()
 
 
 @router.post("/verify-email/{token}")
-async def verify_email(token: str, db: Annotated[Session, Depends(get_db)]):
+async def verify_email(token: str, db: Annotated[AsyncSession, Depends(get_async_db)]):
     # verify token
     email = verify_token(token=token)
 
     if not email:
         raise HTTPException(status_code=400, detail="Invalid token")
 
-    user = get_user_by_email(session=db, email=email)
+    user = await get_user_by_email(session=db, email=email)
 
     if not user:
         raise HTTPException(
@@ -45,15 +46,16 @@ async def verify_email(token: str, db: Annotated[Session, Depends(get_db)]):
 
     user.is_active = True
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    invalidate_cached_user(user.id)
+    await db.refresh(user)
     return JSONResponse(status_code=201, content={"message": "Email verified"})
 
   
 @router.post("/password-recovery/{email}")
-async def recover_password(email: str, db: Annotated[Session, Depends(get_db)]):
+async def recover_password(email: str, db: Annotated[AsyncSession, Depends(get_async_db)]):
     "Forgot password flow"
-    user = get_user_by_email(session=db, email=email)
+    user = await get_user_by_email(session=db, email=email)
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -64,13 +66,15 @@ async def recover_password(email: str, db: Annotated[Session, Depends(get_db)]):
     email_data = generate_reset_password_email(
         email_to=user.email, email=email, token=password_reset_token
     )
-    send_email(email_to=user.email ,subject =email_data.subject, html_content = email_data.html_content)
+    async with serialized_write():
+        enqueue_email(db, email_to=user.email, subject=email_data.subject, html_content=email_data.html_content)
+        await db.commit()
     return Message(message="Password recovery email sent")
 
 
 @router.post("/reset-password/")
-def reset_password(
-    db: Annotated[Session, Depends(get_db)], body: NewPassword
+async def reset_password(
+    db: Annotated[AsyncSession, Depends(get_async_db)], body: NewPassword
 ) -> Message:
     """
     Reset password
@@ -78,7 +82,7 @@ def reset_password(
     email = verify_token(token=body.token)
     if not email:
         raise HTTPException(status_code=400, detail="Invalid token")
-    user = get_user_by_email(session=db, email=email)
+    user = await get_user_by_email(session=db, email=email)
     if not user:
         raise HTTPException(
             status_code=404,
@@ -87,14 +91,15 @@ def reset_password(
     elif not user.is_active:
         raise HTTPException(status_code=400, detail="User is not Verified")
     
-    hashed_password = get_password_hash(password=body.new_password)
+    hashed_password = await password_hasher.hash(body.new_password)
     user.password = hashed_password
     
     for field, value in user.dict().items():
         setattr(user, field, value)
     
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    invalidate_cached_user(user.id)
+    await db.refresh(user)
     
     return Message(message="Password updated successfully")
 
@@ -1,24 +1,34 @@
-from fastapi import APIRouter, Depends, HTTPException,Path
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException,Path, Query, Request, status
 from fastapi.security import OAuth2PasswordBearer
 
-from sqlmodel import Session
-from app.deps import get_db, get_current_user
+import orjson
 
-from app.models import Booking, Waste, User,UpdateDeliveryStatus
-from typing import List
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import insert
+from sqlmodel import select, and_, or_
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.deps import get_async_db, get_current_user
+from app.db import serialized_write
+from app.pagination import Page, decode_cursor, page_size, paginate
+from app.responses import ORJSONResponse
+
+from app.models import Booking, BookingDeleted, BookingRead, BookingReplaced, BookingResult, BookingStatus, Waste, User, read_columns
+from app.config import settings
+from app.geocoding import geocode_many, locate_bookings, location_fields
+from typing import Any, List
+from datetime import date
 
-from fastapi.encoders import jsonable_encoder
-from fastapi.responses import JSONResponse
 
 from typing import Annotated
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-@router.post("/booking", status_code=201, response_model =Waste)
+@router.post("/booking", status_code=200, response_model=BookingResult)
 async def booking(
     waste: Booking,
-    db: Session = Depends(get_db),
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user),
 ):
     """ This is the booking route. It first checks if a user is authorized before the user can place a booking.
@@ -35,45 +45,223 @@ async def booking(
     
     waste = waste.model_dump()
     waste["user_id"] = current_user.id
+    # only the cache is read here; a new address is geocoded after the response
+    locations = await geocode_many(db, [waste["address"]], max_lookups=0)
+    waste.update(location_fields(locations.get(waste["address"])))
     waste_create = Waste(**waste)
     waste_create.user = user
     
-    db.add(waste_create)
-    db.commit()
-    db.refresh(waste_create)
-    
-    waste_create = jsonable_encoder(waste_create)
-    
-    return JSONResponse(
+    async with serialized_write():
+        db.add(waste_create)
+        await db.commit()
+    await db.refresh(waste_create)
+    if waste["address"] not in locations:
+        background_tasks.add_task(locate_bookings, [waste_create.id])
+
+    return ORJSONResponse(
     status_code=200,
     content={
         "message": "booking created successfully",
-        "booking":waste_create
+        "booking": BookingRead.model_validate(waste_create)
     })
     
 
-@router.get("/booking", response_model=List[Waste], status_code=200)
+booking_adapter = TypeAdapter(Booking)
+NDJSON_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl"}
+
+
+async def read_bulk_items(request: Request) -> tuple[list[Any], bool]:
+    """Items of a bulk request and whether they are raw NDJSON lines.
+
+    A JSON body must be an array. An NDJSON body is read line by line as it
+    arrives, so an oversized batch is refused without buffering all of it.
+    Either body is cut off with a 413 once it outgrows BULK_BOOKING_MAX_ITEMS
+    times BULK_BOOKING_MAX_ITEM_BYTES.
+    """
+    limit = settings.BULK_BOOKING_MAX_ITEMS
+    max_bytes = limit * settings.BULK_BOOKING_MAX_ITEM_BYTES
+    too_many = HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"A bulk request can hold at most {limit} bookings.",
+    )
+    too_large = HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"A bulk request body can be at most {max_bytes} bytes.",
+    )
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > max_bytes:
+        raise too_large
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type in NDJSON_TYPES:
+        lines, buffer, received = [], b"", 0
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > max_bytes:
+                raise too_large
+            buffer += chunk
+            *complete, buffer = buffer.split(b"\n")
+            lines.extend(line for line in complete if line.strip())
+            if len(lines) > limit:
+                raise too_many
+        if buffer.strip():
+            lines.append(buffer)
+        if len(lines) > limit:
+            raise too_many
+        return lines, True
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > max_bytes:
+            raise too_large
+    try:
+        items = orjson.loads(body)
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="The body must be a JSON array of bookings.")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="The body must be a JSON array of bookings.")
+    if len(items) > limit:
+        raise too_many
+    return items, False
+
+
+@router.post(
+    "/bulk",
+    status_code=201,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": {"type": "array", "items": {"$ref": "#/components/schemas/Booking"}}
+                },
+                "application/x-ndjson": {"schema": {"type": "string"}},
+            },
+        }
+    },
+)
+async def bulk_booking(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user),
+):
+    """ Create many bookings in one request, as a JSON array or as NDJSON (one booking per line).
+
+        Every item is validated first; the valid ones are then inserted together in a
+        single transaction. The response has one result per item, in request order:
+        "created" with the new booking id, or "invalid" with the validation errors.
+        The status is 201 when all items were created, 207 when only some were and
+        422 when none were. Addresses that are not cached yet and over
+        GEOCODER_MAX_LOOKUPS_PER_REQUEST are geocoded after the response is sent,
+        so those bookings get their coordinates a little later.
+    """
+    items, is_ndjson = await read_bulk_items(request)
+
+    results: list[dict[str, Any]] = []
+    rows: list[dict[str, Any]] = []
+    for index, item in enumerate(items):
+        try:
+            if is_ndjson:
+                waste = booking_adapter.validate_json(item)
+            else:
+                waste = booking_adapter.validate_python(item)
+        except ValidationError as e:
+            errors = e.errors(include_url=False, include_context=False, include_input=False)
+            results.append({"index": index, "status": "invalid", "errors": errors})
+            continue
+        results.append({"index": index, "status": "created"})
+        rows.append({
+            **waste.model_dump(),
+            "user_id": current_user.id,
+            "order_status": BookingStatus.pending,
+            "delivery_status": False,
+        })
+
+    if rows:
+        locations = await geocode_many(
+            db, {row["address"] for row in rows}, max_lookups=settings.GEOCODER_MAX_LOOKUPS_PER_REQUEST
+        )
+        for row in rows:
+            row.update(location_fields(locations.get(row["address"])))
+        statement = insert(Waste).returning(Waste.id, sort_by_parameter_order=True)
+        async with serialized_write():
+            # one executemany; SQLAlchemy batches it into multi-row INSERT ... RETURNING
+            ids = (await db.execute(statement, rows)).scalars().all()
+            await db.commit()
+        created = iter(ids)
+        for result in results:
+            if result["status"] == "created":
+                result["id"] = next(created)
+        unlocated = [booking_id for booking_id, row in zip(ids, rows) if row["address"] not in locations]
+        if unlocated:
+            background_tasks.add_task(locate_bookings, unlocated)
+
+    if not rows:
+        status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    elif len(rows) < len(results):
+        status_code = status.HTTP_207_MULTI_STATUS
+    else:
+        status_code = status.HTTP_201_CREATED
+    return ORJSONResponse(
+        status_code=status_code,
+        content={
+            "created": len(rows),
+            "invalid": len(results) - len(rows),
+            "results": results,
+        })
+
+
+def bookings_after(cursor: dict):
+    """Keyset condition for rows after ``cursor`` in (pickup_date NULLS LAST, id) order."""
+    try:
+        booking_id = int(cursor["id"])
+        pickup_date = date.fromisoformat(cursor["pickup_date"]) if cursor["pickup_date"] else None
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if pickup_date is None:
+        return and_(Waste.pickup_date.is_(None), Waste.id > booking_id)
+    return or_(
+        Waste.pickup_date > pickup_date,
+        and_(Waste.pickup_date == pickup_date, Waste.id > booking_id),
+        Waste.pickup_date.is_(None),
+    )
+
+
+@router.get("/booking", response_model=Page[BookingRead], status_code=200)
 async def get_bookings_by_user(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
+    cursor: str | None = Query(None, description="next_cursor from the previous page"),
+    limit: int = Depends(page_size),
 ):
-    """ This route gets a user's booking orders from the database.
+    """ This route gets a user's booking orders from the database, ordered by pickup date.
+    Pass the returned next_cursor to get the following page; it is null on the last page.
     """
     if not current_user:
         raise HTTPException(status_code=401, detail="Unauthorized")
-    user_bookings = db.query(Waste).filter(Waste.user_id == current_user.id).all()
-    
- 
-    user_bookings = jsonable_encoder(user_bookings)
-    return  user_bookings
+    statement = (
+        select(*read_columns(BookingRead, Waste))
+        .where(Waste.user_id == current_user.id)
+        .order_by(Waste.pickup_date.asc().nulls_last(), Waste.id)
+        .limit(limit + 1)
+    )
+    after = decode_cursor(cursor)
+    if after is not None:
+        statement = statement.where(bookings_after(after))
+    user_bookings = (await db.exec(statement)).all()
+
+    user_bookings, next_cursor = paginate(
+        user_bookings, limit, lambda row: {"pickup_date": row.pickup_date, "id": row.id}
+    )
+    return {"items": user_bookings, "next_cursor": next_cursor}
    
 
 
-@router.delete("/booking/{booking_id}", status_code=204 )
+@router.delete("/booking/{booking_id}", response_model=BookingDeleted, status_code=200)
 async def delete_booking(
     booking_id: Annotated[int ,Path(discription="Add the booking ID , which is int" , examples="3")],
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Delete a booking by its ID.
@@ -85,33 +273,33 @@ async def delete_booking(
     if not current_user:
         raise HTTPException(status_code=401, detail="Unauthorized")
     
-    booking = db.get(Waste, booking_id)
+    booking = await db.get(Waste, booking_id)
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
     
     if booking.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Unauthorized to delete this booking")
     
-    db.delete(booking)
-    db.commit()
+    async with serialized_write():
+        await db.delete(booking)
+        await db.commit()
     
-    booking = jsonable_encoder(booking)
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=200,
         content={
             "message": "Booking deleted successfully",
-            "deleted_booking": booking
+            "deleted_booking": BookingRead.model_validate(booking)
         })
 
     
 
 
 
-@router.patch("/booking/{booking_id}", response_model=UpdateDeliveryStatus, status_code = 200)
+@router.patch("/booking/{booking_id}", response_model=BookingResult, status_code = 200)
 async def update_booking(
     booking_id: Annotated[int ,Path(discription="Add the booking ID , which is int" , examples="3")],
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Update a booking delivery status by its ID.
@@ -122,7 +310,7 @@ async def update_booking(
     if not current_user:
         raise HTTPException(status_code=401, detail="Unauthorized")
     
-    booking = db.get(Waste, booking_id)
+    booking = await db.get(Waste, booking_id)
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
     
@@ -135,26 +323,26 @@ async def update_booking(
     for field, value in booking.dict().items():
         setattr(booking, field, value)
     
-    db.commit()
-    db.refresh(booking)
-    
-    booking = jsonable_encoder(booking)
-    
+    async with serialized_write():
+        await db.commit()
+    await db.refresh(booking)
+
     booking
-    return JSONResponse(
+    return ORJSONResponse(
     status_code=200,
     content={
         "message": "booking delivery status updated successfully",
-        "booking":booking
+        "booking": BookingRead.model_validate(booking)
     })
     
 
-@router.put("/booking/{booking_id}", response_model=Waste , status_code =200)
+@router.put("/booking/{booking_id}", response_model=BookingReplaced, status_code =200)
 async def replace_booking(
     booking_id: Annotated[int , Path(discription ="Add the booking id, note id is an int", example="3")],
     updated_booking: Booking,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Replace a booking by its ID.
@@ -166,7 +354,7 @@ async def replace_booking(
     if not current_user:
         raise HTTPException(status_code=401, detail="Unauthorized")
     
-    booking = db.get(Waste, booking_id)
+    booking = await db.get(Waste, booking_id)
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
     
@@ -175,19 +363,27 @@ async def replace_booking(
     
     
     # Delete the existing booking and create a new one with the updated data
-    for field, value in updated_booking.dict().items():
+    fields = updated_booking.dict()
+    unlocated = False
+    if fields["address"] != booking.address:
+        # as in booking(): cached coordinates now, a new address after the response
+        locations = await geocode_many(db, [fields["address"]], max_lookups=0)
+        fields.update(location_fields(locations.get(fields["address"])))
+        unlocated = fields["address"] not in locations
+    for field, value in fields.items():
         setattr(booking, field, value)
     
-    db.commit()
-    db.refresh(booking)
-    
-    booking = jsonable_encoder(booking)
-    
-    return JSONResponse(
+    async with serialized_write():
+        await db.commit()
+    await db.refresh(booking)
+    if unlocated:
+        background_tasks.add_task(locate_bookings, [booking.id])
+
+    return ORJSONResponse(
     status_code=200,
     content={
         "message": "bookimg updated successfully",
-        "created_review": booking
+        "created_review": BookingRead.model_validate(booking)
     })
 
 
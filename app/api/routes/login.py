@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.deps import get_db
+from app.deps import get_async_db
 from app.models import  Token , User
 
 from typing import Annotated
@@ -16,7 +16,9 @@ from app.config import settings
 from app.crud import get_user_by_email
 from app.crud import get_user_by_email
 
-from app.utils import create_token,send_email , generate_verification_email
+from app.utils import create_token, generate_verification_email
+from app.mailer import enqueue_email
+from app.db import serialized_write
 from fastapi.responses import JSONResponse
 
 
@@ -25,14 +27,14 @@ router=APIRouter()
 @router.post("/login")
 async def login(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[AsyncSession, Depends(get_async_db)]
 
 ):
     """"
     The login Auth route , takes the users Email and Password , and returns the user details with the token
     """
     # get user by email
-    user = crud.authenticate(
+    user = await crud.authenticate(
         session=db, email=form_data.username, password=form_data.password
     )
     if not user:
@@ -53,8 +55,8 @@ async def login(
     
 
 @router.post("/login/{email}")
-async def login_verify_email(email:str , db: Annotated[Session, Depends(get_db)]):
-    user= get_user_by_email(session=db, email = email)
+async def login_verify_email(email:str , db: Annotated[AsyncSession, Depends(get_async_db)]):
+    user= await get_user_by_email(session=db, email = email)
     
     """"This route allows the user to still verify his email , when logged in.
     note a user is still allowed to login when he/she registers.
@@ -71,7 +73,9 @@ async def login_verify_email(email:str , db: Annotated[Session, Depends(get_db)]
     
     token = create_token(subject=user.email, type_ops="verify")
     data = generate_verification_email(email_to=user.email, email= user.email , token=token)
-    send_email(email_to=user.email ,subject =data.subject, html_content = data.html_content)       
+    async with serialized_write():
+        enqueue_email(db, email_to=user.email, subject=data.subject, html_content=data.html_content)
+        await db.commit()
     
     return JSONResponse(status_code =200, content={ "message": "A mail to verify your Email have been sent "})        
             
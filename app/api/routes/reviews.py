@@ -1,16 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, Query , Path
-from fastapi.responses import JSONResponse
 
-from sqlmodel import Session
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from typing import List
 
 from app.crud import create_review, get_reviews_by_user_id, update_review, delete_review
-from app.deps import get_db, get_current_user
+from app.deps import get_async_db, get_current_user
+from app.db import serialized_write
+from app.pagination import Page, decode_cursor, page_size, paginate
+from app.responses import ORJSONResponse
 
-from app.models import Review, User, ReviewBase
+from app.models import Review, ReviewRead, User, ReviewBase, read_columns
 from typing import Annotated
 
-from fastapi.encoders import jsonable_encoder
 
 router = APIRouter()
 
@@ -22,7 +24,7 @@ async def create_review(
     comment:Annotated[str | None, Query(max_length=300)],
     reviewer_name:Annotated[str | None , Query(max_length=50)] = None,
     rating: Annotated[str | None, Query()] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -32,7 +34,7 @@ async def create_review(
         comment (str): The comment or review text.
         reviewer_name (str): The name of the reviewer.
         rating (int): The rating given by the reviewer.
-        db (Session, optional): The database session. Defaults to Depends(get_db).
+        db (AsyncSession, optional): The database session. Defaults to Depends(get_async_db).
         current_user (User, optional): The current authenticated user. Defaults to Depends(get_current_user).
 
     Returns:
@@ -61,45 +63,58 @@ async def create_review(
     
     # review["user_id"] = current_user.id
     
-    db.add(review)
-    db.commit()
-    db.refresh(review)
-    
-    review  = jsonable_encoder(review )
-    
-    return JSONResponse(
+    async with serialized_write():
+        db.add(review)
+        await db.commit()
+    await db.refresh(review)
+
+    return ORJSONResponse(
         status_code=200,
         content={
             "message": "review created successfully",
-            "created_review": review 
+            "created_review": ReviewRead.model_validate(review)
         })
     
  
     
 # Read reviews made by the current user
-@router.get("/review/", response_model=List[Review], status_code=200)
-def reviews_by_user_route(
+@router.get("/review/", response_model=Page[ReviewRead], status_code=200)
+async def reviews_by_user_route(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)):
+    db: AsyncSession = Depends(get_async_db),
+    cursor: Annotated[str | None, Query(description="next_cursor from the previous page")] = None,
+    limit: int = Depends(page_size)):
     # Check if the current user is authenticated
     if not current_user:
         raise HTTPException(status_code=401, detail="Unauthenticated")
     
+    statement = (
+        select(*read_columns(ReviewRead, Review))
+        .where(Review.user_id == current_user.id)
+        .order_by(Review.id)
+        .limit(limit + 1)
+    )
+    after = decode_cursor(cursor)
+    if after is not None:
+        try:
+            statement = statement.where(Review.id > int(after["id"]))
+        except (KeyError, TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
 
+    user_review = (await db.exec(statement)).all()
+    user_review, next_cursor = paginate(user_review, limit, lambda row: {"id": row.id})
 
-    user_review = db.query(Review).filter(Review.user_id == current_user.id).all()
-
-    return user_review
+    return {"items": user_review, "next_cursor": next_cursor}
 
 
 
 # Update a review by ID , made by the current user.
-@router.put("/review/{review_id}/", response_model=Review, status_code=200)
-def review_route( 
+@router.put("/review/{review_id}/", response_model=ReviewRead, status_code=200)
+async def review_route( 
     comment:Annotated[str | None, Query(max_length=300)],
     reviewer_name:Annotated[str | None , Query(max_length=50)] = None,
     rating: Annotated[str | None, Query()] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user),
     review_id: int = Annotated[int |None, Path()],
     
@@ -113,7 +128,7 @@ def review_route(
     if not current_user:
         raise HTTPException(status_code=401, detail="Unauthenticated")
     
-    review = db.get(Review, review_id)
+    review = await db.get(Review, review_id)
     if not review:
         raise HTTPException(status_code=404, detail="Booking not found")
     
@@ -134,16 +149,14 @@ def review_route(
     for field, value in update_review.dict().items():
         setattr(review, field, value)
     
-    db.commit()
-    db.refresh(review)
+    await db.commit()
+    await db.refresh(review)
 
-    review  = jsonable_encoder(review )
-
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=200,
         content={
             "message": "review updated successfully",
-            "updated_review": review 
+            "updated_review": ReviewRead.model_validate(review)
         })
     
     
@@ -153,29 +166,27 @@ def review_route(
 
 # Delete a review by ID
 @router.delete("/review/{review_id}/", status_code=204 )
-def review_route(review_id: int = Annotated[int |None, Path()], current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def review_route(review_id: int = Annotated[int |None, Path()], current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     # Check if the current user is authenticated
     
     # Delete the review
     if not current_user:
         raise HTTPException(status_code=401, detail="Unauthorized")
     
-    review = db.get(Review, review_id)
+    review = await db.get(Review, review_id)
     if not review :
         raise HTTPException(status_code=404, detail="Booking not found")
     
     if review .user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Unauthorized to delete this booking")
     
-    db.delete(review )
-    db.commit()
-    
-    review  = jsonable_encoder(review )
-    
-    return JSONResponse(
+    await db.delete(review )
+    await db.commit()
+
+    return ORJSONResponse(
         status_code=200,
         content={
             "message": "review deleted successfully",
-            "deleted_review": review 
+            "deleted_review": ReviewRead.model_validate(review)
         })
 
@@ -1,15 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
 from sqlmodel import Session, select
-from app.deps import get_db, get_current_user
-from app.models import UserCreate, User, UserUpdate
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.deps import get_db, get_async_db, get_current_user, invalidate_cached_user
+from app.db import serialized_write
+from app.models import UserCreate, UserCreated, User, UserPublic, UserUpdate
 from typing import Annotated, Any
-from app.utils import get_password_hash, save_profile_picture, validate_picture
+from app.utils import save_profile_picture, create_token, generate_verification_email, verify_token
+from app.crud import get_user_by_email
+from app.passwords import password_hasher
+from app.mailer import enqueue_email
+from app.images import variant_path
+from app.static import file_response
+from app.storage import profile_pictures
+from app.responses import ORJSONResponse
+from fastapi.concurrency import run_in_threadpool
+import os
 from sqlalchemy.orm import registry
 from sqlalchemy.exc import IntegrityError
-from fastapi.responses import JSONResponse, FileResponse
-from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, RedirectResponse
 from fastapi import File, UploadFile
-from botocore.client import Config
 from fastapi import Response
 
 
@@ -21,14 +30,14 @@ mapper_registry = registry()
 
 router = APIRouter()
 
-@router.post("/register" , response_model=UserCreate )
+@router.post("/register" , response_model=UserCreated, status_code=201)
 async def register(
     user: UserCreate, 
-    db: Annotated[Session,  Depends(get_db)]
+    db: Annotated[AsyncSession,  Depends(get_async_db)]
 ):
     """ this user registration route, take note  to put a valid phonenumber, start with the country code of the phonenumber.
     """
-    db_email =db.query(User).filter(User.email ==user.email).first()
+    db_email = await get_user_by_email(session=db, email=user.email)
     
     if db_email is not None:
         raise  HTTPException(status_code = status.HTTP_400_BAD_REQUEST, 
@@ -37,19 +46,21 @@ async def register(
     
     token = create_token(subject=user.email, type_ops="verify")
     data = generate_verification_email(email_to=user.email, email= user.email , token=token)
-    send_email(email_to=user.email ,subject =data.subject, html_content = data.html_content)
+
+    #hash the password 
+    user.password = await password_hasher.hash(user.password)
         
     try:
         
-        #hash the password 
-        user.password = get_password_hash(user.password)
         new_user =User(**user.model_dump())
-        db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
+        async with serialized_write():
+            db.add(new_user)
+            # the verification mail is only sent if the user row is committed
+            enqueue_email(db, email_to=user.email, subject=data.subject, html_content=data.html_content)
+            await db.commit()
+        await db.refresh(new_user)
         
-        new_user =jsonable_encoder(new_user)
-        return JSONResponse(status_code =201, content={"data": new_user , "message": "user created successfully"})
+        return ORJSONResponse(status_code =201, content={"data": UserPublic.model_validate(new_user), "message": "user created successfully"})
     
     except Exception as e:
         error_message = "An error occurred while creating the user."   
@@ -60,14 +71,14 @@ async def register(
 
 
 @router.post("/verify-email/{token}")
-async def verify_email(token: str, db: Annotated[Session, Depends(get_db)]):
+async def verify_email(token: str, db: Annotated[AsyncSession, Depends(get_async_db)]):
     # verify token
     email = verify_token(token=token)
 
     if not email:
         raise HTTPException(status_code=400, detail="Invalid token")
 
-    user = get_user_by_email(session=db, email=email)
+    user = await get_user_by_email(session=db, email=email)
 
     if not user:
         raise HTTPException(
@@ -77,24 +88,21 @@ async def verify_email(token: str, db: Annotated[Session, Depends(get_db)]):
 
     user.is_active = True
     db.add(user)
-    db.commit()
-    db.refresh(user)
-    return JSONResponse(status_code=201, content={"message": "Email verified"})
+    await db.commit()
+    invalidate_cached_user(user.id)
+    await db.refresh(user)
+    return ORJSONResponse(status_code=201, content={"message": "Email verified"})
 
 
 
 
 @router.get("/profile")
-async def user_profile ( current_user: int = Depends(get_current_user), db: Session = Depends(get_db)):
+async def user_profile ( current_user: int = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     
     if not current_user:
         raise HTTPException(status_code=401, detail="Unauthorized")
     
-    user = current_user.model_dump()
-
-    if not user:   
-        raise HTTPException(status_code=404, detail="User not found")
-    return jsonable_encoder(user)
+    return ORJSONResponse(UserPublic.model_validate(current_user))
 
 
    
@@ -103,7 +111,7 @@ async def user_profile ( current_user: int = Depends(get_current_user), db: Sess
 async def update_user_profile(
     user_data: UserCreate, 
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """This route updates user profile.
     
@@ -114,26 +122,25 @@ async def update_user_profile(
     if not current_user:
         raise HTTPException(status_code=401, detail="User not authenticated")
 
-    user = db.query(User).filter(User.email == current_user.email).first()
+    user = await get_user_by_email(session=db, email=current_user.email)
 
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
 
-    user_data.password =get_password_hash(user_data.password)
+    user_data.password = await password_hasher.hash(user_data.password)
     # Update user profile fields
     for field, value in user_data.dict(exclude_unset=True).items():
         setattr(user, field, value)
 
-    db.commit()
-    db.refresh(user)
-
-    user = jsonable_encoder(user)
+    await db.commit()
+    invalidate_cached_user(user.id)
+    await db.refresh(user)
 
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=200,
         content={
             "message": "User profile updated successfully",
-            "updated_profile": user
+            "updated_profile": UserPublic.model_validate(user)
         }
     )
 
@@ -142,7 +149,7 @@ async def update_user_profile(
 @router.delete("/profile", status_code=204 )
 async def delete_user_profile(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """this route deleted current user profile
     Current User can decide to delete his/her accout.
@@ -152,12 +159,11 @@ async def delete_user_profile(
     if not current_user:
         raise HTTPException(status_code=401, detail="Unauthorized")
     
-    user = db.query(User).filter(User.email == current_user.email).first()
+    user = await get_user_by_email(session=db, email=current_user.email)
     
-    db.delete(user)
-    db.commit()
-    db.refresh(user_data)
-    return user_data
+    await db.delete(user)
+    await db.commit()
+    invalidate_cached_user(user.id)
 @router.delete("/profile")
 def user_profile(user_data: UserUpdate, current_user: int = Depends(get_current_user), db: Session = Depends(get_db)):
     if not  current_user:
@@ -172,35 +178,53 @@ def user_profile(user_data: UserUpdate, current_user: int = Depends(get_current_
 
 
 @router.post("/user/profile-picture")
-def upload_profile_picture(
+async def upload_profile_picture(
     profile_picture: UploadFile = File(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     statement = select(User).where(User.id == current_user.id)
-    db_user = db.exec(statement).first()
+    db_user = (await db.exec(statement)).first()
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
     changes_made = False
     if profile_picture:
-        validate_picture(profile_picture)
         changes_made = True
-        db_user.profile_picture = save_profile_picture(profile_picture)
+        db_user.profile_picture = await save_profile_picture(profile_picture)
         
     if changes_made:
-        db.commit()
+        await db.commit()
+        invalidate_cached_user(db_user.id)
         return {"message": "User details updated successfully"}
     else:
         return {"message": "No changes made"}
 
 @router.get("/user/profile-picture")
-def get_profile_picture(
-    db: Session = Depends(get_db),
+async def get_profile_picture(
+    request: Request,
+    size: str = Query("original", description="A thumbnail size from PROFILE_PICTURE_SIZES (e.g. 64, 256) or original"),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
+    if size != "original" and size not in {str(s) for s in settings.PROFILE_PICTURE_SIZES}:
+        raise HTTPException(status_code=400, detail="Unsupported picture size")
     statement = select(User.profile_picture).where(User.id == current_user.id)
-    profile_picture = db.execute(statement).scalar()
+    profile_picture = (await db.exec(statement)).first()
     if not profile_picture:
         raise HTTPException(status_code=404, detail="Profile picture not found")
-    return FileResponse(profile_picture)
+    original = os.path.basename(profile_picture)
+    # pictures uploaded before thumbnails existed only have the original
+    for name in dict.fromkeys((variant_path(original, size), original)):
+        if not await run_in_threadpool(profile_pictures.exists, name):
+            continue
+        # object storage: send the client straight to the bucket instead of proxying the bytes
+        url = await run_in_threadpool(profile_pictures.url, name)
+        if url is not None:
+            return RedirectResponse(url, status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+        return await file_response(request, profile_pictures.path(name))
+    # pictures saved on local disk before STORAGE_BACKEND was switched to s3
+    legacy_path = os.path.join(".", settings.PROFILE_PICTURE_DIR, original)
+    if os.path.exists(legacy_path):
+        return await file_response(request, legacy_path)
+    raise HTTPException(status_code=404, detail="Profile picture not found")
 
@@ -0,0 +1,68 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+from app.metrics import REGISTRY
+
+
+CACHE_HITS = REGISTRY.counter("cache_hits_total", "In-process cache hits.", labelnames=("cache",))
+CACHE_MISSES = REGISTRY.counter("cache_misses_total", "In-process cache misses.", labelnames=("cache",))
+CACHE_SIZE = REGISTRY.gauge("cache_entries", "Entries currently held by an in-process cache.", labelnames=("cache",))
+
+
+class TTLCache:
+    """A bounded LRU mapping whose entries also expire after ``ttl`` seconds.
+
+    A ``ttl`` or ``maxsize`` of 0 turns the cache off: ``set`` is ignored and
+    every ``get`` is a miss.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        CACHE_SIZE.set_function(lambda: len(self._data), cache=name)
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0 and self.ttl > 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    CACHE_HITS.inc(cache=self.name)
+                    return value
+                del self._data[key]
+        CACHE_MISSES.inc(cache=self.name)
+        return default
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        """Store ``value``; ``ttl`` can only shorten the cache-wide lifetime."""
+        if not self.enabled:
+            return
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -46,7 +46,124 @@ class Settings(BaseSettings):
     SMTP_PORT: int = 2525
     SMTP_HOST: str 
     SMTP_USER: str 
-    SMTP_PASSWORD: str 
+    SMTP_PASSWORD: str
+
+    DATABASE_URL: str = "sqlite:///database.sqlite"
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30
+    # seconds before a pooled connection is replaced, -1 keeps them forever
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # per-statement limit in milliseconds (Postgres only), 0 disables it
+    DB_STATEMENT_TIMEOUT_MS: int = 0
+
+    # SQLite production mode: WAL journal plus the pragmas below on every connection
+    SQLITE_TUNING: bool = False
+    SQLITE_SYNCHRONOUS: Literal["OFF", "NORMAL", "FULL"] = "NORMAL"
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    # negative values are KiB, so this is a 64 MB page cache
+    SQLITE_CACHE_SIZE: int = -64000
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+
+    # cursor pagination on list endpoints
+    PAGE_SIZE_DEFAULT: int = 20
+    PAGE_SIZE_MAX: int = 100
+
+    # most bookings accepted by one POST /bookings/bulk request
+    BULK_BOOKING_MAX_ITEMS: int = 500
+    # body size allowed per booking; a bulk body may be up to MAX_ITEMS times this
+    BULK_BOOKING_MAX_ITEM_BYTES: int = 4 * 1024
+
+    # pickup route planning (app.scheduling); without a depot every route of a group
+    # starts from the group's south-westernmost booking
+    SCHEDULE_VEHICLE_CAPACITY: int = 20
+    SCHEDULE_DEPOT_LATITUDE: Optional[float] = None
+    SCHEDULE_DEPOT_LONGITUDE: Optional[float] = None
+
+    # booking addresses are geocoded once and cached in the geocodecache table;
+    # "fixture" answers from a local JSON file, "nominatim" calls GEOCODER_URL
+    GEOCODER_BACKEND: Literal["fixture", "nominatim"] = "fixture"
+    # None uses app/geocoding-fixtures.json
+    GEOCODER_FIXTURE_PATH: Optional[str] = None
+    GEOCODER_URL: str = "https://nominatim.openstreetmap.org/search"
+    GEOCODER_TIMEOUT_SECONDS: float = 5
+    # comma-separated ISO 3166-1 codes to restrict results to, e.g. "ng"
+    GEOCODER_COUNTRY_CODES: Optional[str] = "ng"
+    # Nominatim's usage policy allows one request per second; 0 disables the limit
+    GEOCODER_MAX_REQUESTS_PER_SECOND: float = 1
+    # new addresses a bulk request waits for; the rest are located after the response
+    GEOCODER_MAX_LOOKUPS_PER_REQUEST: int = 5
+
+    # resolved users are cached per process; 0 disables the cache
+    USER_CACHE_TTL_SECONDS: int = 30
+    USER_CACHE_MAX_SIZE: int = 1024
+
+    # verified bearer tokens are cached until they expire; 0 disables the cache
+    TOKEN_CACHE_TTL_SECONDS: int = 300
+    TOKEN_CACHE_MAX_SIZE: int = 4096
+
+    # outgoing mail is queued in the emailoutbox table and sent by a background worker
+    EMAIL_BACKEND: Literal["smtp", "file", "console"] = "smtp"
+    EMAIL_FILE_SINK_DIR: str = "sent_emails"
+    EMAIL_OUTBOX_POLL_SECONDS: float = 5
+    EMAIL_OUTBOX_BATCH_SIZE: int = 50
+    EMAIL_SEND_RETRIES: int = 3
+    EMAIL_MAX_ATTEMPTS: int = 8
+    EMAIL_RETRY_BACKOFF_SECONDS: int = 30
+    # compiled email templates; None uses a per-user directory under the system temp dir
+    EMAIL_TEMPLATE_CACHE_DIR: Optional[str] = None
+
+    PROFILE_PICTURE_DIR: str = "profile_pictures"
+    PROFILE_PICTURE_MAX_BYTES: int = 10 * 1024 * 1024
+    # every upload is stored re-encoded without EXIF, plus one thumbnail per size
+    PROFILE_PICTURE_FORMAT: Literal["webp", "jpeg"] = "webp"
+    PROFILE_PICTURE_SIZES: list[int] = [64, 256]
+    IMAGE_WORKERS: int = 2
+
+    # where profile pictures live: local disk (single node) or an S3-compatible bucket
+    STORAGE_BACKEND: Literal["local", "s3"] = "local"
+    S3_BUCKET: str = ""
+    S3_PREFIX: str = "profile_pictures"
+    S3_REGION: Optional[str] = None
+    # set for MinIO or another S3-compatible server, None means AWS
+    S3_ENDPOINT_URL: Optional[str] = None
+    S3_ACCESS_KEY_ID: Optional[str] = None
+    S3_SECRET_ACCESS_KEY: Optional[str] = None
+    S3_PRESIGN_EXPIRE_SECONDS: int = 3600
+    S3_MULTIPART_THRESHOLD: int = 8 * 1024 * 1024
+    S3_MULTIPART_CHUNKSIZE: int = 8 * 1024 * 1024
+
+    # bcrypt runs on a bounded pool so it never blocks the event loop
+    PASSWORD_HASH_BACKEND: Literal["thread", "process"] = "thread"
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_QUEUE_DEPTH: int = 32
+
+    # development checks for N+1 queries (app.querydebug): "warn" logs, "strict" raises
+    QUERY_DEBUG: Literal["off", "warn", "strict"] = "off"
+    QUERY_BUDGET: int = 20
+    # the same statement shape more often than this in one request looks like N+1
+    QUERY_REPEAT_LIMIT: int = 5
+    # statements at least this slow are logged with their plan while QUERY_DEBUG is on
+    SLOW_QUERY_MS: float = 100
+
+    # request profiling (app.profiling): a random sample, or on request with the header and token
+    PROFILE_SAMPLE_RATE: float = 0.0
+    PROFILE_HEADER: str = "X-Profile"
+    # None disables profiling by header
+    PROFILE_TOKEN: Optional[str] = None
+    PROFILE_MIN_DURATION_MS: float = 0
+    PROFILE_BUFFER_SIZE: int = 50
+
+    # logging (app.log): JSON lines on stdout, written by a background thread
+    LOG_FORMAT: Literal["json", "text"] = "json"
+    LOG_LEVEL: str = "INFO"
+    # per-logger overrides, e.g. {"sqlalchemy.engine": "INFO"}
+    LOG_LEVELS: dict[str, str] = {}
+    # auth failures: the first LOG_SAMPLE_BURST per window are kept, then one in LOG_SAMPLE_RATE
+    LOG_SAMPLE_BURST: int = 20
+    LOG_SAMPLE_RATE: int = 100
+    LOG_SAMPLE_WINDOW_SECONDS: float = 10
 
 
 settings = Settings()
@@ -1,13 +1,206 @@
+import asyncio
+import time
+import weakref
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
 from sqlmodel import create_engine, Session, SQLModel
-import json
-# from app.config import DATABASE_URL
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.config import settings
+from app.instrumentation import record_statement
+from app.metrics import REGISTRY
+from app.querydebug import check_statement
+
+
+POOL_CHECKOUT_WAIT = REGISTRY.histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a connection from the pool.",
+    labelnames=("engine",),
+)
+POOL_IN_USE = REGISTRY.gauge(
+    "db_pool_connections_in_use",
+    "Connections currently checked out of the pool.",
+    labelnames=("engine",),
+)
+POOL_SIZE = REGISTRY.gauge(
+    "db_pool_connections_open",
+    "Connections currently held by the pool, idle or in use.",
+    labelnames=("engine",),
+)
+
+# plain postgres URLs would get psycopg2, which is not a dependency
+SYNC_DRIVERS = {
+    "postgres": "postgresql+psycopg",
+    "postgresql": "postgresql+psycopg",
+}
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgres": "postgresql+psycopg",
+    "postgresql": "postgresql+psycopg",
+}
+
+
+def get_sync_url(url: str) -> str:
+    """Use psycopg (3) for a postgres URL that names no driver; explicit drivers are kept."""
+    scheme, sep, rest = url.partition("://")
+    driver = SYNC_DRIVERS.get(scheme)
+    if driver is None:
+        return url
+    return f"{driver}{sep}{rest}"
+
+
+def get_async_url(url: str) -> str:
+    """Swap the sync driver in ``url`` for its async counterpart (aiosqlite / psycopg)."""
+    scheme, sep, rest = url.partition("://")
+    driver = ASYNC_DRIVERS.get(scheme.split("+")[0])
+    if driver is None:
+        return url
+    return f"{driver}{sep}{rest}"
+
+
+class _TimedCheckoutMixin:
+    metrics_label = "sync"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start, engine=self.metrics_label)
+
+
+class TimedQueuePool(_TimedCheckoutMixin, QueuePool):
+    metrics_label = "sync"
+
+
+class TimedAsyncQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    metrics_label = "async"
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:")
+
+
+def engine_options(url: str, poolclass) -> dict:
+    """Pool and connection arguments for ``url``, driven by the DB_* settings."""
+    options = {}
+    if not _is_memory_sqlite(url):
+        options.update(
+            poolclass=poolclass,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+        )
+    if make_url(url).get_backend_name() == "postgresql" and settings.DB_STATEMENT_TIMEOUT_MS:
+        options["connect_args"] = {
+            "options": f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"
+        }
+    return options
+
+
+def instrument_pool(sync_engine: Engine, label: str) -> None:
+    # read through the engine so the gauges follow the pool across dispose()
+    def _in_use() -> float:
+        pool = sync_engine.pool
+        return pool.checkedout() if hasattr(pool, "checkedout") else 0
+
+    def _open() -> float:
+        pool = sync_engine.pool
+        return pool.checkedin() + pool.checkedout() if hasattr(pool, "checkedin") else 0
+
+    POOL_IN_USE.set_function(_in_use, engine=label)
+    POOL_SIZE.set_function(_open, engine=label)
+
+
+def instrument_queries(sync_engine: Engine, label: str) -> None:
+    """Time every statement on ``sync_engine`` and count it against the current request."""
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _finish(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        record_statement(elapsed, label)
+        if settings.QUERY_DEBUG != "off":
+            check_statement(conn, statement, parameters, executemany, elapsed, label)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _failed(exception_context):
+        connection = exception_context.connection
+        started = connection.info.get("query_started") if connection is not None else None
+        if started:
+            record_statement(time.perf_counter() - started.pop(), label)
+
+
+def sqlite_pragmas() -> list[str]:
+    return [
+        "PRAGMA journal_mode=WAL",
+        f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}",
+        f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}",
+        f"PRAGMA cache_size={settings.SQLITE_CACHE_SIZE}",
+        f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}",
+    ]
+
+
+def tune_sqlite(sync_engine: Engine) -> None:
+    """Apply the SQLITE_* pragmas to every new connection of ``sync_engine``."""
+    pragmas = sqlite_pragmas()
+
+    @event.listens_for(sync_engine, "connect")
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+database_url = get_sync_url(settings.DATABASE_URL)
+async_database_url = get_async_url(database_url)
+
+engine = create_engine(database_url, **engine_options(database_url, TimedQueuePool))
+async_engine = create_async_engine(
+    async_database_url, **engine_options(async_database_url, TimedAsyncQueuePool)
+)
 
-sqlite_file_name = "database.sqlite"
-sqlite_url = f"sqlite:///{sqlite_file_name}"
+instrument_pool(engine, "sync")
+instrument_pool(async_engine.sync_engine, "async")
+instrument_queries(engine, "sync")
+instrument_queries(async_engine.sync_engine, "async")
 
-engine = create_engine(sqlite_url)
+is_sqlite = make_url(database_url).get_backend_name() == "sqlite"
+if is_sqlite and settings.SQLITE_TUNING:
+    tune_sqlite(engine)
+    tune_sqlite(async_engine.sync_engine)
 
+# SQLite allows a single writer at a time; queueing writers here keeps them
+# from fighting over the file lock and failing with "database is locked".
+# An asyncio.Lock belongs to one event loop, so there is one per loop.
+_sqlite_writers: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
 
 
+def _sqlite_writer() -> asyncio.Lock:
+    loop = asyncio.get_running_loop()
+    lock = _sqlite_writers.get(loop)
+    if lock is None:
+        lock = _sqlite_writers[loop] = asyncio.Lock()
+    return lock
 
 
+@asynccontextmanager
+async def serialized_write() -> AsyncIterator[None]:
+    """Wrap a write + commit so that only one runs at a time on SQLite."""
+    if not is_sqlite:
+        yield
+        return
+    async with _sqlite_writer():
+        yield
@@ -1,12 +1,16 @@
 from sqlmodel import Session
-from app.db import engine
-from typing import Generator, Annotated
+from sqlalchemy.orm import make_transient_to_detached
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.db import engine, async_engine
+from typing import AsyncGenerator, Generator, Annotated
 from app.config import settings
 from fastapi import Depends, HTTPException, status
 from app.utils import verify_token_access
+from app.cache import TTLCache
 from app.models import User
 from fastapi.security import OAuth2PasswordBearer
 from typing import Optional
+import uuid
 
 
 
@@ -20,16 +24,39 @@ def get_db() -> Generator[Session, None, None]:
         yield session
 
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
+
 SessionDep = Annotated[Session, Depends(get_db)]
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_db)]
 TokenDep = Annotated[str, Depends(reusable_oauth2)]
 
+# column values of recently resolved users, keyed by user id
+user_cache = TTLCache(
+    "user", maxsize=settings.USER_CACHE_MAX_SIZE, ttl=settings.USER_CACHE_TTL_SECONDS
+)
+
+
+def invalidate_cached_user(user_id: uuid.UUID | None) -> None:
+    """Drop a user from the cache after its row was changed or deleted."""
+    user_cache.pop(user_id)
 
-def get_current_user(session: SessionDep, token: TokenDep) -> User:
+
+async def get_current_user(session: AsyncSessionDep, token: TokenDep) -> User:
     token_data = verify_token_access(token)
 
+    cached = user_cache.get(token_data.sub)
+    if cached is not None:
+        # attach a copy to this request's session without going to the database
+        user = User(**cached)
+        make_transient_to_detached(user)
+        session.add(user)
+        return user
 
-    user = session.get(User, token_data.sub)
+    user = await session.get(User, token_data.sub)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    user_cache.set(user.id, user.model_dump())
     return user
-
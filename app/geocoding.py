@@ -0,0 +1,391 @@
+"""Address normalization, geocoding with a cache table, and geohash proximity helpers.
+
+Addresses are normalized first, and that form is the key of the
+``geocodecache`` table, so each distinct address reaches the provider once
+(misses are cached too). The provider is chosen with GEOCODER_BACKEND. The
+"fixture" provider answers from a JSON file with no network access and is
+meant for development and tests; "nominatim" calls an OpenStreetMap
+Nominatim server, at most GEOCODER_MAX_REQUESTS_PER_SECOND times a second
+across the process. Single bookings only read the cache; a bulk request
+waits for at most GEOCODER_MAX_LOOKUPS_PER_REQUEST new addresses. Bookings
+left without coordinates are located by ``locate_bookings`` once the
+response has been sent.
+
+Bookings store a geohash next to their coordinates. A "within N km" search
+turns into range scans over the geohash index for the cell around the point
+and its eight neighbours, followed by an exact haversine check.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import re
+import time
+import unicodedata
+import weakref
+from pathlib import Path
+from typing import Iterable, Optional
+
+import httpx
+from sqlalchemy import and_, or_, update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.config import settings
+from app.db import async_engine, is_sqlite, serialized_write
+from app.metrics import REGISTRY
+from app.models import GeocodeCache, Waste
+
+
+logger = logging.getLogger(__name__)
+
+GEOCODE_LOOKUPS = REGISTRY.counter(
+    "geocode_lookups_total", "Address lookups by outcome.", labelnames=("result",)
+)
+
+Coordinates = tuple[float, float]
+
+FIXTURES_PATH = Path(__file__).parent / "geocoding-fixtures.json"
+
+EARTH_RADIUS_KM = 6371.0088
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+# precision stored on bookings, cells of about 5 x 5 m
+GEOHASH_PRECISION = 9
+
+ABBREVIATIONS = {
+    "st": "street",
+    "str": "street",
+    "rd": "road",
+    "ave": "avenue",
+    "av": "avenue",
+    "cres": "crescent",
+    "cl": "close",
+    "blvd": "boulevard",
+    "est": "estate",
+    "hwy": "highway",
+    "expy": "expressway",
+}
+
+
+def normalize_address(address: str) -> str:
+    """Canonical form of a free-text address: lower case, no punctuation, common abbreviations spelled out."""
+    text = unicodedata.normalize("NFKC", address).lower()
+    text = re.sub(r"[^\w\s,]", " ", text)
+    parts = []
+    for part in text.split(","):
+        words = [ABBREVIATIONS.get(word, word) for word in part.split()]
+        if words:
+            parts.append(" ".join(words))
+    return ", ".join(parts)
+
+
+def haversine_km(a: Coordinates, b: Coordinates) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (*a, *b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h))
+
+
+def geohash_encode(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+
+def _cell_size_degrees(precision: int) -> tuple[float, float]:
+    """(latitude, longitude) span of a geohash cell."""
+    lat_bits = 5 * precision // 2
+    lon_bits = 5 * precision - lat_bits
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def geohash_precision_for(radius_km: float, latitude: float) -> int:
+    """Longest geohash whose cells are at least ``radius_km`` across, so 3 x 3 cells cover the circle."""
+    cos_latitude = max(math.cos(math.radians(latitude)), 1e-6)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_span, lon_span = _cell_size_degrees(precision)
+        height = lat_span * math.pi * EARTH_RADIUS_KM / 180
+        width = lon_span * math.pi * EARTH_RADIUS_KM / 180 * cos_latitude
+        if min(height, width) >= radius_km:
+            return precision
+    return 1
+
+
+def geohash_neighbourhood(latitude: float, longitude: float, precision: int) -> set[str]:
+    """The cell containing the point and its eight neighbours."""
+    lat_span, lon_span = _cell_size_degrees(precision)
+    cells = set()
+    for dlat in (-lat_span, 0.0, lat_span):
+        for dlon in (-lon_span, 0.0, lon_span):
+            lat = min(max(latitude + dlat, -90.0), 90.0)
+            lon = (longitude + dlon + 180.0) % 360.0 - 180.0
+            cells.add(geohash_encode(lat, lon, precision))
+    return cells
+
+
+def _prefix_upper_bound(prefix: str) -> Optional[str]:
+    """Smallest geohash after every hash starting with ``prefix`` (None past "zzz...").
+
+    Staying inside the geohash alphabet keeps the range valid under any
+    collation, unlike appending a punctuation character.
+    """
+    chars = list(prefix)
+    while chars:
+        position = GEOHASH_ALPHABET.index(chars[-1])
+        if position + 1 < len(GEOHASH_ALPHABET):
+            chars[-1] = GEOHASH_ALPHABET[position + 1]
+            return "".join(chars)
+        chars.pop()
+    return None
+
+
+def within_clause(latitude: float, longitude: float, radius_km: float):
+    """SQL condition selecting bookings in the geohash cells around a point.
+
+    It is a superset of the bookings within ``radius_km``; callers finish
+    with haversine_km. Each cell is a range on the indexed geohash column.
+    """
+    precision = geohash_precision_for(radius_km, latitude)
+    conditions = []
+    for cell in sorted(geohash_neighbourhood(latitude, longitude, precision)):
+        upper = _prefix_upper_bound(cell)
+        if upper is None:
+            conditions.append(Waste.geohash >= cell)
+        else:
+            conditions.append(and_(Waste.geohash >= cell, Waste.geohash < upper))
+    return or_(*conditions)
+
+
+def location_fields(coordinates: Optional[Coordinates]) -> dict:
+    """Waste column values for a geocoding result."""
+    if coordinates is None:
+        return {"latitude": None, "longitude": None, "geohash": None}
+    latitude, longitude = coordinates
+    return {"latitude": latitude, "longitude": longitude, "geohash": geohash_encode(latitude, longitude)}
+
+
+class GeocodingError(Exception):
+    """The provider could not answer right now; the result is not cached."""
+
+
+class FixtureGeocoder:
+    """Answers from a JSON file: exact normalized addresses first, then known areas.
+
+    Area matches get a small offset (under about 1 km) derived from the address,
+    so that different streets in one area do not all land on the same point.
+    """
+
+    name = "fixture"
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._data: Optional[dict] = None
+
+    @property
+    def data(self) -> dict:
+        if self._data is None:
+            raw = json.loads(self.path.read_text())
+            self._data = {
+                "addresses": {normalize_address(k): v for k, v in raw.get("addresses", {}).items()},
+                "areas": {normalize_address(k): v for k, v in raw.get("areas", {}).items()},
+            }
+        return self._data
+
+    async def lookup(self, normalized: str) -> Optional[Coordinates]:
+        exact = self.data["addresses"].get(normalized)
+        if exact is not None:
+            return tuple(exact)
+        parts = normalized.split(", ")
+        # the street is the first part; the area is one of the following ones
+        for part in parts[1:] + parts[:1]:
+            area = self.data["areas"].get(part)
+            if area is not None:
+                digest = hashlib.sha256(normalized.encode()).digest()
+                offset_lat = (digest[0] / 255 - 0.5) * 0.015
+                offset_lon = (digest[1] / 255 - 0.5) * 0.015
+                return round(area[0] + offset_lat, 6), round(area[1] + offset_lon, 6)
+        return None
+
+
+class RateLimiter:
+    """Spaces out calls to at most ``rate`` per second, across every task of the process."""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0.0
+        # an asyncio.Lock belongs to one event loop; made for the loop that first waits
+        self._locks: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._next_call = 0.0
+
+    async def wait(self) -> None:
+        if not self.interval:
+            return
+        loop = asyncio.get_running_loop()
+        lock = self._locks.get(loop)
+        if lock is None:
+            lock = self._locks[loop] = asyncio.Lock()
+        async with lock:
+            now = time.monotonic()
+            if self._next_call > now:
+                await asyncio.sleep(self._next_call - now)
+            self._next_call = max(now, self._next_call) + self.interval
+
+
+class NominatimGeocoder:
+    """OpenStreetMap Nominatim search API, over one kept-alive HTTP client."""
+
+    name = "nominatim"
+
+    def __init__(self, url: str, timeout: float, country_codes: Optional[str], rate: float = 1):
+        self.url = url
+        self.timeout = timeout
+        self.country_codes = country_codes
+        self.rate_limiter = RateLimiter(rate)
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                headers={"User-Agent": f"{settings.PROJECT_NAME} geocoder"},
+            )
+        return self._client
+
+    async def lookup(self, normalized: str) -> Optional[Coordinates]:
+        params = {"q": normalized, "format": "jsonv2", "limit": 1}
+        if self.country_codes:
+            params["countrycodes"] = self.country_codes
+        await self.rate_limiter.wait()
+        try:
+            response = await self.client.get(self.url, params=params)
+            response.raise_for_status()
+            results = response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            raise GeocodingError(str(e)) from e
+        if not results:
+            return None
+        return float(results[0]["lat"]), float(results[0]["lon"])
+
+
+def get_geocoder():
+    if settings.GEOCODER_BACKEND == "nominatim":
+        return NominatimGeocoder(
+            settings.GEOCODER_URL,
+            settings.GEOCODER_TIMEOUT_SECONDS,
+            settings.GEOCODER_COUNTRY_CODES,
+            settings.GEOCODER_MAX_REQUESTS_PER_SECOND,
+        )
+    return FixtureGeocoder(settings.GEOCODER_FIXTURE_PATH or FIXTURES_PATH)
+
+
+geocoder = get_geocoder()
+
+
+def _insert_ignoring_duplicates():
+    if is_sqlite:
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+    # two requests may geocode the same new address at once; the first row wins
+    return insert(GeocodeCache).on_conflict_do_nothing(index_elements=["address"])
+
+
+async def geocode_many(
+    session: AsyncSession, addresses: Iterable[str], max_lookups: Optional[int] = None
+) -> dict[str, Optional[Coordinates]]:
+    """Coordinates for each address (None when unknown), keyed by the address as given.
+
+    Cached results are read in one query; new ones are stored and committed
+    on ``session``. Provider failures are logged and give None without being
+    cached, so the address is tried again next time. With ``max_lookups``
+    only that many new addresses go to the provider; the others are left out
+    of the result.
+    """
+    by_normalized: dict[str, list[str]] = {}
+    for address in addresses:
+        by_normalized.setdefault(normalize_address(address), []).append(address)
+
+    found: dict[str, Optional[Coordinates]] = {}
+    if by_normalized:
+        statement = select(GeocodeCache).where(GeocodeCache.address.in_(list(by_normalized)))
+        for row in (await session.exec(statement)).all():
+            found[row.address] = None if row.latitude is None else (row.latitude, row.longitude)
+    GEOCODE_LOOKUPS.inc(len(found), result="cached")
+
+    missing = [normalized for normalized in by_normalized if normalized not in found]
+    if max_lookups is not None:
+        missing = missing[:max_lookups]
+    new_rows = []
+    for normalized in missing:
+        try:
+            coordinates = await geocoder.lookup(normalized)
+        except GeocodingError as e:
+            logger.warning("geocoding %r failed: %s", normalized, e)
+            GEOCODE_LOOKUPS.inc(result="error")
+            found[normalized] = None
+            continue
+        GEOCODE_LOOKUPS.inc(result="found" if coordinates else "not_found")
+        found[normalized] = coordinates
+        new_rows.append({
+            "address": normalized,
+            "latitude": coordinates[0] if coordinates else None,
+            "longitude": coordinates[1] if coordinates else None,
+            "provider": geocoder.name,
+        })
+
+    if new_rows:
+        async with serialized_write():
+            await session.execute(_insert_ignoring_duplicates(), new_rows)
+            await session.commit()
+
+    return {
+        address: found[normalized]
+        for normalized, originals in by_normalized.items()
+        if normalized in found
+        for address in originals
+    }
+
+
+async def locate_bookings(booking_ids: list[int]) -> None:
+    """Geocode the given bookings that have no coordinates yet, on a session of its own.
+
+    Run as a background task once bookings were saved without them; the
+    provider is only asked at GEOCODER_MAX_REQUESTS_PER_SECOND, so this can
+    take a while.
+    """
+    try:
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            statement = (
+                select(Waste.id, Waste.address)
+                .where(Waste.id.in_(booking_ids))
+                .where(Waste.latitude.is_(None))
+            )
+            rows = (await session.exec(statement)).all()
+            if not rows:
+                return
+            locations = await geocode_many(session, {row.address for row in rows})
+            located = [
+                {"id": row.id, **location_fields(locations[row.address])}
+                for row in rows
+                if locations[row.address] is not None
+            ]
+            if located:
+                async with serialized_write():
+                    await session.execute(update(Waste), located)
+                    await session.commit()
+    except Exception:
+        logger.exception("locating %d bookings failed", len(booking_ids))
@@ -0,0 +1,103 @@
+import asyncio
+import hashlib
+import io
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import HTTPException
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from app.config import settings
+
+
+FORMAT_EXTENSIONS = {"webp": "webp", "jpeg": "jpg"}
+
+
+def variant_path(original_path: str, size: str) -> str:
+    """Path of the ``size`` variant stored next to ``original_path`` ("original" is the file itself)."""
+    if size == "original":
+        return original_path
+    root, extension = os.path.splitext(original_path)
+    return f"{root}_{size}{extension}"
+
+
+def _encode(image: Image.Image, image_format: str) -> bytes:
+    buffer = io.BytesIO()
+    # no exif= argument, so EXIF (GPS, camera, ...) is not carried over
+    image.save(buffer, format=image_format.upper(), quality=85)
+    return buffer.getvalue()
+
+
+def _write_atomic(data: bytes, path: str) -> None:
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".variant-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file_object:
+            file_object.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def generate_variants(source_path: str, upload_folder: str, sizes: list[int], image_format: str) -> str:
+    """Re-encode ``source_path`` into ``upload_folder`` plus one thumbnail per size.
+
+    Runs in a worker process. The files are named after the hash of the
+    re-encoded picture, so a name always refers to the same bytes and can be
+    cached forever. EXIF orientation is applied to the pixels before the
+    metadata is dropped, so stripped pictures are not shown rotated.
+    """
+    with Image.open(source_path) as opened:
+        image = ImageOps.exif_transpose(opened)
+        if image_format == "jpeg" and image.mode != "RGB":
+            image = image.convert("RGB")
+        elif image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+        image.load()
+    original = _encode(image, image_format)
+    digest = hashlib.sha256(original).hexdigest()[:32]
+    original_path = os.path.join(upload_folder, f"{digest}.{FORMAT_EXTENSIONS[image_format]}")
+    for size in sizes:
+        thumbnail = image.copy()
+        thumbnail.thumbnail((size, size))
+        _write_atomic(_encode(thumbnail, image_format), variant_path(original_path, str(size)))
+    # written last: once the original exists, all of its thumbnails do too
+    _write_atomic(original, original_path)
+    return original_path
+
+
+class ImageProcessor:
+    """Runs Pillow work on a process pool so it neither blocks the loop nor holds the GIL."""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor: ProcessPoolExecutor | None = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    async def create_variants(self, source_path: str, upload_folder: str) -> str:
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(
+                self.executor,
+                generate_variants,
+                source_path,
+                upload_folder,
+                settings.PROFILE_PICTURE_SIZES,
+                settings.PROFILE_PICTURE_FORMAT,
+            )
+        except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError):
+            raise HTTPException(status_code=400, detail="The uploaded picture could not be read.")
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+image_processor = ImageProcessor(workers=settings.IMAGE_WORKERS)
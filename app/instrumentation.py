@@ -0,0 +1,166 @@
+"""Per-request timing: route latency, SQL statements and time, bcrypt and JWT.
+
+``RequestMetricsMiddleware`` opens a ``RequestTimings`` for each HTTP
+request in a context variable. The SQL hooks installed by
+``app.db.instrument_queries`` and the bcrypt and JWT helpers add to it
+through ``add_timing``. When the response is finished, the totals go to
+the Prometheus histograms served at /metrics. In local mode they are also
+sent back in a ``Server-Timing`` header, which browser dev tools show next
+to the request.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Iterator, Optional
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+from app.metrics import REGISTRY
+
+
+# per-request counts are small integers, not durations
+STATEMENT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request to sending the last byte of its response.",
+    labelnames=("method", "route", "status"),
+)
+REQUEST_DB_STATEMENTS = REGISTRY.histogram(
+    "http_request_db_statements",
+    "SQL statements executed while handling a request.",
+    labelnames=("method", "route"),
+    buckets=STATEMENT_BUCKETS,
+)
+REQUEST_DB_SECONDS = REGISTRY.histogram(
+    "http_request_db_seconds",
+    "Time spent executing SQL while handling a request.",
+    labelnames=("method", "route"),
+)
+DB_STATEMENT_SECONDS = REGISTRY.histogram(
+    "db_statement_seconds",
+    "Execution time of single SQL statements.",
+    labelnames=("engine",),
+)
+JWT_SECONDS = REGISTRY.histogram(
+    "jwt_seconds",
+    "Time spent encoding or decoding JWTs.",
+    labelnames=("operation",),
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025),
+)
+
+
+@dataclass
+class RequestTimings:
+    # what is being timed, e.g. "GET /api/v1/bookings/booking"
+    label: str = ""
+    started: float = field(default_factory=time.perf_counter)
+    db_statements: int = 0
+    db_seconds: float = 0.0
+    # other named phases, e.g. "bcrypt" and "jwt"
+    phases: dict[str, float] = field(default_factory=dict)
+    # per-request state of optional checks (app.querydebug)
+    extra: dict = field(default_factory=dict)
+
+    def server_timing(self) -> str:
+        entries = [f"app;dur={(time.perf_counter() - self.started) * 1e3:.1f}"]
+        if self.db_statements:
+            entries.append(f'db;dur={self.db_seconds * 1e3:.1f};desc="{self.db_statements} queries"')
+        entries.extend(f"{name};dur={seconds * 1e3:.1f}" for name, seconds in self.phases.items())
+        return ", ".join(entries)
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def current_timings() -> Optional[RequestTimings]:
+    """Timings of the request being handled, or None outside a request."""
+    return _current.get()
+
+
+@contextmanager
+def request_scope(label: str = "") -> Iterator[RequestTimings]:
+    """Collect timings for the block; the middleware opens one per request."""
+    timings = RequestTimings(label=label)
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+def add_timing(phase: str, seconds: float) -> None:
+    timings = _current.get()
+    if timings is not None:
+        timings.phases[phase] = timings.phases.get(phase, 0.0) + seconds
+
+
+@contextmanager
+def timed_phase(phase: str, histogram=None, **labels: str) -> Iterator[None]:
+    """Add the time spent in the block to ``phase`` of the current request (and to ``histogram``)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if histogram is not None:
+            histogram.observe(elapsed, **labels)
+        add_timing(phase, elapsed)
+
+
+def record_statement(seconds: float, engine: str) -> None:
+    DB_STATEMENT_SECONDS.observe(seconds, engine=engine)
+    timings = _current.get()
+    if timings is not None:
+        timings.db_statements += 1
+        timings.db_seconds += seconds
+
+
+def route_label(scope: Scope) -> str:
+    """The matched route template, so /booking/12 and /booking/13 share one series."""
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    app = scope.get("app")
+    root_path = scope.get("root_path", "")
+    # mounted apps (static files) only leave their mount point behind
+    if root_path and app is not None and not hasattr(app, "router"):
+        return root_path
+    return "unmatched"
+
+
+class RequestMetricsMiddleware:
+    """Times every HTTP request and adds the Server-Timing header in local mode."""
+
+    def __init__(self, app: ASGIApp, server_timing: Optional[bool] = None):
+        self.app = app
+        self.server_timing = settings.ENVIRONMENT == "local" if server_timing is None else server_timing
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    MutableHeaders(scope=message).append("Server-Timing", timings.server_timing())
+            await send(message)
+
+        with request_scope(f"{scope['method']} {scope['path']}") as timings:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                method, route = scope["method"], route_label(scope)
+                REQUEST_SECONDS.observe(
+                    time.perf_counter() - timings.started, method=method, route=route, status=status
+                )
+                REQUEST_DB_STATEMENTS.observe(timings.db_statements, method=method, route=route)
+                REQUEST_DB_SECONDS.observe(timings.db_seconds, method=method, route=route)
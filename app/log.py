@@ -0,0 +1,195 @@
+"""Structured JSON logging that never writes from the event loop.
+
+``configure_logging`` puts a QueueHandler on the root logger. Callers only
+format the message and append the record to an in-memory queue; a
+QueueListener thread turns records into JSON lines on stdout. Each record
+carries the id of the request it was logged in. RequestIdMiddleware takes
+that id from the X-Request-ID header, or makes one up, and echoes it on the
+response.
+
+Levels are LOG_LEVEL for everything plus LOG_LEVELS per logger, e.g.
+LOG_LEVELS='{"app.querydebug": "DEBUG", "sqlalchemy.engine": "INFO"}'.
+
+Auth failures are logged on the "app.auth" logger, which is sampled. In
+every LOG_SAMPLE_WINDOW_SECONDS window the first LOG_SAMPLE_BURST records
+pass, then one in LOG_SAMPLE_RATE. The next record that passes reports how
+many were dropped before it. A brute-force attack costs a bounded number of
+log lines instead of one per attempt.
+"""
+import atexit
+import logging
+import queue
+import re
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+import orjson
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+from app.metrics import REGISTRY
+
+
+LOG_RECORDS_SAMPLED_OUT = REGISTRY.counter(
+    "log_records_sampled_out_total", "Log records dropped by sampling.", labelnames=("logger",)
+)
+
+REQUEST_ID_HEADER = "X-Request-ID"
+# ids from clients are echoed into logs and headers, so only plain tokens are accepted
+_VALID_REQUEST_ID = re.compile(r"[A-Za-z0-9._:-]{1,128}")
+# attributes every LogRecord has; anything else was passed in ``extra``
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+
+request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+auth_logger = logging.getLogger("app.auth")
+
+# SQLAlchemy names pool loggers after the pool class, so the instrumented pools
+# in app.db log at INFO under app.db.*; keep them at WARNING like sqlalchemy.pool
+QUIET_LOGGERS = ("app.db.TimedQueuePool", "app.db.TimedAsyncQueuePool")
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp the current request id on the record while still on the caller's context."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Let ``burst`` records through per window, then one in ``rate``."""
+
+    def __init__(self, burst: int, rate: int, window_seconds: float):
+        super().__init__()
+        self.burst = burst
+        self.rate = max(rate, 1)
+        self.window_seconds = window_seconds
+        self._lock = threading.Lock()
+        self._window_start = 0.0
+        self._seen = 0
+        self._dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            if now - self._window_start >= self.window_seconds:
+                self._window_start, self._seen = now, 0
+            self._seen += 1
+            if self._seen > self.burst and (self._seen - self.burst) % self.rate:
+                self._dropped += 1
+                LOG_RECORDS_SAMPLED_OUT.inc(logger=record.name)
+                return False
+            if self._dropped:
+                record.sampled_out, self._dropped = self._dropped, 0
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, request id, extras, traceback."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return orjson.dumps(entry, default=str).decode()
+
+
+class _QueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # the default prepare() runs the full formatter on the caller's thread;
+        # only merge the arguments and render the traceback, leave JSON to the listener
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_listener: Optional[QueueListener] = None
+
+
+def configure_logging() -> None:
+    """Route all logging through the queue; safe to call more than once."""
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler()
+    if settings.LOG_FORMAT == "json":
+        output.setFormatter(JSONFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    handler = _QueueHandler(records)
+    handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(settings.LOG_LEVEL)
+    for name in QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(logging.WARNING)
+    for name, level in settings.LOG_LEVELS.items():
+        logging.getLogger(name).setLevel(level)
+
+    auth_logger.addFilter(SamplingFilter(
+        settings.LOG_SAMPLE_BURST, settings.LOG_SAMPLE_RATE, settings.LOG_SAMPLE_WINDOW_SECONDS
+    ))
+
+    _listener = QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Write out whatever is still queued and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class RequestIdMiddleware:
+    """Bind a request id for the duration of each HTTP request and return it in X-Request-ID."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        incoming = Headers(scope=scope).get(REQUEST_ID_HEADER)
+        current = incoming if incoming and _VALID_REQUEST_ID.fullmatch(incoming) else uuid.uuid4().hex
+        token = request_id.set(current)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)[REQUEST_ID_HEADER] = current
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_id.reset(token)
@@ -0,0 +1,232 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from email.utils import formataddr
+from pathlib import Path
+
+import aiosmtplib
+from sqlalchemy import event, update
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from tenacity import AsyncRetrying, retry_if_exception_type, stop_after_attempt, wait_exponential
+
+from app.config import settings
+from app.db import async_engine, serialized_write
+from app.metrics import REGISTRY
+from app.models import EmailOutbox, EmailStatus
+
+
+logger = logging.getLogger(__name__)
+
+EMAILS_SENT = REGISTRY.counter(
+    "emails_sent_total", "Outbox emails by delivery result.", labelnames=("result",)
+)
+
+# how long a claimed message is hidden from other workers while it is being sent
+CLAIM_LEASE = timedelta(minutes=2)
+
+
+def build_message(email_to: str, subject: str, html_content: str) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = formataddr((settings.EMAILS_FROM_NAME, settings.EMAILS_FROM_EMAIL))
+    message["To"] = email_to
+    message["Subject"] = subject
+    message.set_content("This message requires an HTML capable mail client.")
+    message.add_alternative(html_content, subtype="html")
+    return message
+
+
+class SMTPSender:
+    """Sends over one SMTP connection that is kept open between messages."""
+
+    def __init__(self):
+        self._smtp: aiosmtplib.SMTP | None = None
+
+    async def _connection(self) -> aiosmtplib.SMTP:
+        if self._smtp is None or not self._smtp.is_connected:
+            self._smtp = aiosmtplib.SMTP(
+                hostname=settings.SMTP_HOST,
+                port=settings.SMTP_PORT,
+                username=settings.SMTP_USER,
+                password=settings.SMTP_PASSWORD,
+                use_tls=settings.SMTP_SSL,
+                start_tls=settings.SMTP_TLS and not settings.SMTP_SSL,
+            )
+            await self._smtp.connect()
+        return self._smtp
+
+    async def send(self, message: EmailMessage) -> None:
+        smtp = await self._connection()
+        try:
+            await smtp.send_message(message)
+        except aiosmtplib.SMTPServerDisconnected:
+            self._smtp = None
+            raise
+
+    async def close(self) -> None:
+        if self._smtp is not None and self._smtp.is_connected:
+            try:
+                await self._smtp.quit()
+            except aiosmtplib.SMTPException:
+                pass
+        self._smtp = None
+
+
+class FileSender:
+    """Writes each message as an .eml file, for local development and tests."""
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+
+    async def send(self, message: EmailMessage) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        name = f"{datetime.utcnow():%Y%m%d%H%M%S%f}-{message['To']}.eml"
+        await asyncio.to_thread((self.directory / name).write_bytes, message.as_bytes())
+
+    async def close(self) -> None:
+        pass
+
+
+class ConsoleSender:
+    async def send(self, message: EmailMessage) -> None:
+        logger.info("email to %s: %s", message["To"], message["Subject"])
+
+    async def close(self) -> None:
+        pass
+
+
+def get_sender():
+    if settings.EMAIL_BACKEND == "file":
+        return FileSender(settings.EMAIL_FILE_SINK_DIR)
+    if settings.EMAIL_BACKEND == "console":
+        return ConsoleSender()
+    return SMTPSender()
+
+
+class OutboxWorker:
+    """Drains the emailoutbox table in the background.
+
+    Each message gets EMAIL_SEND_RETRIES quick attempts (tenacity, exponential
+    wait); if those fail it is rescheduled with a growing delay until it has
+    been tried EMAIL_MAX_ATTEMPTS times, after which it is marked FAILED.
+    """
+
+    def __init__(self, sender=None):
+        self.sender = sender or get_sender()
+        self._task: asyncio.Task | None = None
+        # both belong to the loop the worker runs on, so they are set in start()
+        self._wakeup: asyncio.Event | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run(), name="email-outbox")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._loop = self._wakeup = None
+        await self.sender.close()
+
+    def wake(self) -> None:
+        """Ask the worker to drain now instead of waiting for the next poll."""
+        loop, wakeup = self._loop, self._wakeup
+        if loop is not None and wakeup is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(wakeup.set)
+
+    async def _run(self) -> None:
+        while True:
+            # any error is logged and the worker carries on; only cancellation stops it
+            try:
+                while await self.drain():
+                    pass
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), settings.EMAIL_OUTBOX_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+            except Exception:
+                logger.exception("email outbox worker failed, retrying after the poll interval")
+                await asyncio.sleep(settings.EMAIL_OUTBOX_POLL_SECONDS)
+
+    async def _claim(self, session: AsyncSession, message: EmailOutbox) -> bool:
+        # compare-and-set on next_attempt_at, so only one worker process gets the row
+        statement = (
+            update(EmailOutbox)
+            .where(EmailOutbox.id == message.id)
+            .where(EmailOutbox.next_attempt_at == message.next_attempt_at)
+            .values(next_attempt_at=datetime.utcnow() + CLAIM_LEASE)
+        )
+        async with serialized_write():
+            result = await session.execute(statement)
+            await session.commit()
+        return result.rowcount == 1
+
+    async def _send(self, message: EmailOutbox) -> None:
+        async for attempt in AsyncRetrying(
+            stop=stop_after_attempt(settings.EMAIL_SEND_RETRIES),
+            wait=wait_exponential(multiplier=0.5, max=10),
+            retry=retry_if_exception_type((aiosmtplib.SMTPException, OSError)),
+            reraise=True,
+        ):
+            with attempt:
+                await self.sender.send(
+                    build_message(message.email_to, message.subject, message.html_content)
+                )
+
+    async def drain(self) -> int:
+        """Send one batch of due messages and return how many were picked up."""
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            statement = (
+                select(EmailOutbox)
+                .where(EmailOutbox.status == EmailStatus.pending)
+                .where(EmailOutbox.next_attempt_at <= datetime.utcnow())
+                .order_by(EmailOutbox.next_attempt_at)
+                .limit(settings.EMAIL_OUTBOX_BATCH_SIZE)
+            )
+            messages = (await session.exec(statement)).all()
+            for message in messages:
+                if not await self._claim(session, message):
+                    continue
+                message.attempts += 1
+                try:
+                    await self._send(message)
+                except Exception as e:
+                    message.last_error = repr(e)[:500]
+                    if message.attempts >= settings.EMAIL_MAX_ATTEMPTS:
+                        message.status = EmailStatus.failed
+                        EMAILS_SENT.inc(result="failed")
+                    else:
+                        delay = settings.EMAIL_RETRY_BACKOFF_SECONDS * 2 ** (message.attempts - 1)
+                        message.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+                        EMAILS_SENT.inc(result="retry")
+                    logger.warning("email %s to %s failed: %s", message.id, message.email_to, e)
+                else:
+                    message.status = EmailStatus.sent
+                    message.sent_at = datetime.utcnow()
+                    message.last_error = None
+                    EMAILS_SENT.inc(result="sent")
+                async with serialized_write():
+                    session.add(message)
+                    await session.commit()
+            return len(messages)
+
+
+outbox_worker = OutboxWorker()
+
+
+def enqueue_email(session: Session | AsyncSession, email_to: str, subject: str, html_content: str) -> EmailOutbox:
+    """Queue an email on ``session``; it is sent once the caller commits."""
+    message = EmailOutbox(email_to=email_to, subject=subject, html_content=html_content)
+    session.add(message)
+    sync_session = session.sync_session if isinstance(session, AsyncSession) else session
+    event.listen(sync_session, "after_commit", lambda _: outbox_worker.wake(), once=True)
+    return message
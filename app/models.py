@@ -1,10 +1,11 @@
 from sqlmodel import SQLModel, Field, Column, VARCHAR ,Relationship ,Enum
+from sqlalchemy import Index
 from pydantic import EmailStr 
 
 from pydantic_extra_types.phone_numbers import PhoneNumber
 from typing import Optional
  
-from datetime import date  
+from datetime import date, datetime
 from enum import Enum
 
 import uuid
@@ -92,11 +93,22 @@ class Booking (SQLModel):
 
 # This model is for booking wastes disposal
 class Waste(Booking,table=True):
+    # (user_id, pickup_date) also serves plain user_id lookups, so there is no
+    # separate single-column index on the foreign key
+    __table_args__ = (
+        Index("ix_waste_user_id_pickup_date", "user_id", "pickup_date"),
+        Index("ix_waste_order_status_pickup_date", "order_status", "pickup_date"),
+    )
+
     id:  Optional[int] = Field(default=None, primary_key=True, index =True)
     user_id: uuid.UUID | None = Field(default_factory=uuid.uuid4, foreign_key="user.id")
     user: User | None = Relationship(back_populates="waste")
     order_status:Optional[BookingStatus] = Field(default = "PENDING")
     delivery_status:Optional[bool]= Field(default=False)
+    # filled in from the address by app.geocoding; None when it could not be located
+    latitude: Optional[float] = Field(default=None)
+    longitude: Optional[float] = Field(default=None)
+    geohash: Optional[str] = Field(default=None, index=True)
     
 
 class UserUpdate(SQLModel):
@@ -117,7 +129,7 @@ class ReviewBase(SQLModel):
 
 class Review(ReviewBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True, index=True)
-    user_id: uuid.UUID | None = Field(default_factory=uuid.uuid4, foreign_key="user.id")
+    user_id: uuid.UUID | None = Field(default_factory=uuid.uuid4, foreign_key="user.id", index=True)
     user: User | None = Relationship(back_populates="review")
     
 
@@ -137,4 +149,109 @@ class NewPassword(SQLModel):
 class Message(SQLModel):
     message: str
 class UpdateDeliveryStatus(SQLModel):
-    delivery_status: bool
\ No newline at end of file
+    delivery_status: bool
+
+
+# Read schemas: what clients get back. List routes select only these columns
+# (see read_columns) instead of loading whole rows.
+class UserPublic(SQLModel):
+    id: uuid.UUID
+    first_name: str
+    last_name: str
+    email: str
+    phone_number: str
+    is_staff: Optional[bool] = None
+    is_active: Optional[bool] = None
+    profile_picture: Optional[str] = None
+
+
+class UserCreated(SQLModel):
+    data: UserPublic
+    message: str
+
+
+class UserList(SQLModel):
+    message: str
+    users: list[UserPublic]
+    next_cursor: Optional[str] = None
+
+
+class BookingRead(SQLModel):
+    id: int
+    user_id: Optional[uuid.UUID] = None
+    first_name: str
+    last_name: str
+    phone: str
+    address: str
+    pickup_date: Optional[date] = None
+    waste_type: WasteType
+    user_waste: Optional[str] = None
+    amount: Optional[int] = None
+    order_status: Optional[BookingStatus] = None
+    delivery_status: Optional[bool] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+
+
+class BookingResult(SQLModel):
+    message: str
+    booking: BookingRead
+
+
+class BookingReplaced(SQLModel):
+    message: str
+    # PUT /booking/{id} has always returned the booking under this key
+    created_review: BookingRead
+
+
+class BookingDeleted(SQLModel):
+    message: str
+    deleted_booking: BookingRead
+
+
+class ReviewRead(SQLModel):
+    id: int
+    user_id: Optional[uuid.UUID] = None
+    reviewer_name: Optional[str] = None
+    rating: Optional[int] = None
+    comment: str
+
+
+def read_columns(schema: type[SQLModel], table: type[SQLModel]) -> list:
+    """The columns of ``table`` that ``schema`` exposes, for a projected select()."""
+    return [getattr(table, name) for name in schema.model_fields]
+
+
+class EmailStatus(str, Enum):
+    pending = "PENDING"
+    sent = "SENT"
+    failed = "FAILED"
+
+
+# Emails are written here in the same transaction as the change that triggers
+# them and delivered later by app.mailer.OutboxWorker
+class EmailOutbox(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_emailoutbox_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    email_to: str
+    subject: str
+    html_content: str
+    status: EmailStatus = Field(default=EmailStatus.pending)
+    attempts: int = Field(default=0)
+    last_error: Optional[str] = Field(default=None)
+    next_attempt_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    sent_at: Optional[datetime] = Field(default=None)
+
+
+# One row per normalized address ever looked up, including misses (null
+# coordinates), so each address reaches the geocoding provider only once.
+class GeocodeCache(SQLModel, table=True):
+    address: str = Field(primary_key=True)
+    latitude: Optional[float] = Field(default=None)
+    longitude: Optional[float] = Field(default=None)
+    provider: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from fastapi import HTTPException, status
+
+from app.config import settings
+from app.instrumentation import add_timing
+from app.metrics import REGISTRY
+from app.utils import get_password_hash, verify_password
+
+
+PASSWORD_HASH_SECONDS = REGISTRY.histogram(
+    "password_hash_seconds",
+    "Time spent hashing or verifying passwords, including queueing.",
+    labelnames=("operation",),
+)
+PASSWORD_HASH_REJECTED = REGISTRY.counter(
+    "password_hash_rejected_total",
+    "Password operations rejected because the worker pool was saturated.",
+    labelnames=("operation",),
+)
+PASSWORD_HASH_IN_FLIGHT = REGISTRY.gauge(
+    "password_hash_in_flight",
+    "Password operations currently running or queued.",
+)
+
+
+class PasswordHasher:
+    """Runs bcrypt off the event loop on a bounded worker pool.
+
+    At most ``workers + queue_depth`` operations are admitted at once; anything
+    beyond that is rejected with a 429 instead of piling up behind the pool.
+    """
+
+    def __init__(self, workers: int, queue_depth: int, backend: str = "thread"):
+        self.workers = workers
+        self.capacity = workers + queue_depth
+        self.backend = backend
+        self._executor: Executor | None = None
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.backend == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="password-hash"
+                )
+        return self._executor
+
+    def _acquire(self, operation: str) -> None:
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                PASSWORD_HASH_REJECTED.inc(operation=operation)
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Server is busy, please retry shortly.",
+                    headers={"Retry-After": "1"},
+                )
+            self._in_flight += 1
+        PASSWORD_HASH_IN_FLIGHT.inc()
+
+    def _release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+        PASSWORD_HASH_IN_FLIGHT.dec()
+
+    async def _run(self, operation: str, func, *args):
+        self._acquire(operation)
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, func, *args)
+        finally:
+            elapsed = time.perf_counter() - start
+            PASSWORD_HASH_SECONDS.observe(elapsed, operation=operation)
+            add_timing("bcrypt", elapsed)
+            self._release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", get_password_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run("verify", verify_password, plain_password, hashed_password)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    queue_depth=settings.PASSWORD_HASH_QUEUE_DEPTH,
+    backend=settings.PASSWORD_HASH_BACKEND,
+)
@@ -0,0 +1,180 @@
+"""Opt-in cProfile capture of sampled requests, kept in a bounded in-memory buffer.
+
+A request is profiled when it is picked at random (PROFILE_SAMPLE_RATE) or
+when it carries the PROFILE_HEADER header set to PROFILE_TOKEN. Profiles
+of sampled requests faster than PROFILE_MIN_DURATION_MS are dropped, so the
+buffer keeps the slow ones; asked-for ones are always kept and their id is
+returned in an X-Profile-Id header. The newest PROFILE_BUFFER_SIZE are held
+in memory and staff can download them from /admin/profiles. The .prof
+files load with pstats or snakeviz.
+
+cProfile sees one thread. Only one request is profiled at a time, and
+other requests' coroutines that run on the event loop in the meantime
+show up in its profile. Work sent to thread pools (bcrypt, image
+encoding) is not captured, but the time spent waiting for it is.
+"""
+import cProfile
+import io
+import itertools
+import marshal
+import pstats
+import random
+import secrets
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+from app.instrumentation import route_label
+from app.metrics import REGISTRY
+
+
+PROFILES_CAPTURED = REGISTRY.counter(
+    "profiles_captured_total", "Request profiles kept in the buffer.", labelnames=("reason",)
+)
+
+
+@dataclass
+class RequestProfile:
+    id: int
+    method: str
+    path: str
+    route: str
+    status: int
+    duration_ms: float
+    reason: str
+    started_at: datetime
+    stats: dict = field(repr=False)
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "duration_ms": round(self.duration_ms, 3),
+            "reason": self.reason,
+            "started_at": self.started_at,
+        }
+
+    def dump(self) -> bytes:
+        """The profile in the format of cProfile's dump_stats."""
+        return marshal.dumps(self.stats)
+
+    def text(self, limit: int = 40, sort: str = "cumulative") -> str:
+        stream = io.StringIO()
+        stats = pstats.Stats(stream=stream)
+        stats.stats = self.stats
+        stats.get_top_level_stats()
+        stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+
+class ProfileBuffer:
+    """The newest ``size`` profiles; older ones fall off the end."""
+
+    def __init__(self, size: int):
+        self._profiles: deque[RequestProfile] = deque(maxlen=size)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def next_id(self) -> int:
+        with self._lock:
+            return next(self._ids)
+
+    def add(self, profile: RequestProfile) -> None:
+        with self._lock:
+            self._profiles.append(profile)
+
+    def list(self) -> list[RequestProfile]:
+        with self._lock:
+            return list(reversed(self._profiles))
+
+    def get(self, profile_id: int) -> Optional[RequestProfile]:
+        with self._lock:
+            for profile in self._profiles:
+                if profile.id == profile_id:
+                    return profile
+        return None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._profiles.clear()
+
+
+profile_buffer = ProfileBuffer(settings.PROFILE_BUFFER_SIZE)
+
+
+class ProfilingMiddleware:
+    """Runs cProfile around sampled or flagged HTTP requests."""
+
+    def __init__(self, app: ASGIApp, buffer: ProfileBuffer = profile_buffer):
+        self.app = app
+        self.buffer = buffer
+        # one profiler per thread at a time; concurrent picks are skipped
+        self._busy = threading.Lock()
+
+    def _reason(self, scope: Scope) -> Optional[str]:
+        token = settings.PROFILE_TOKEN
+        if token:
+            value = Headers(scope=scope).get(settings.PROFILE_HEADER)
+            if value is not None and secrets.compare_digest(value, token):
+                return "header"
+        if settings.PROFILE_SAMPLE_RATE and random.random() < settings.PROFILE_SAMPLE_RATE:
+            return "sampled"
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        reason = self._reason(scope)
+        if reason is None or not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        profiler = cProfile.Profile()
+        profile_id = self.buffer.next_id()
+        status = 500
+        started_at = datetime.utcnow()
+        started = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                # asked-for profiles are always kept, so the caller can fetch this one
+                if reason == "header":
+                    MutableHeaders(scope=message).append("X-Profile-Id", str(profile_id))
+            await send(message)
+
+        try:
+            profiler.enable()
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                profiler.disable()
+        finally:
+            self._busy.release()
+            duration_ms = (time.perf_counter() - started) * 1000
+            if reason == "header" or duration_ms >= settings.PROFILE_MIN_DURATION_MS:
+                profiler.create_stats()
+                self.buffer.add(RequestProfile(
+                    id=profile_id,
+                    method=scope["method"],
+                    path=scope["path"],
+                    route=route_label(scope),
+                    status=status,
+                    duration_ms=duration_ms,
+                    reason=reason,
+                    started_at=started_at,
+                    stats=profiler.stats,
+                ))
+                PROFILES_CAPTURED.inc(reason=reason)
@@ -0,0 +1,128 @@
+"""Development checks for N+1 queries and slow statements.
+
+Off unless QUERY_DEBUG is "warn" or "strict". Every statement a request
+runs is reduced to its shape: literals and expanded IN lists are folded,
+so loading ``user.waste`` for ten users gives ten copies of one shape. A
+request that runs more than QUERY_BUDGET statements, or one shape more
+than QUERY_REPEAT_LIMIT times, is reported. "warn" logs it once per
+request. "strict" raises QueryBudgetExceeded at the offending statement,
+so the request fails with a traceback that points at the code that issued
+it; use it when running tests.
+
+Statements slower than SLOW_QUERY_MS are logged with the database's plan
+for them in either mode.
+
+Code outside a request, such as a test or a script, can be checked the same
+way inside ``app.instrumentation.request_scope()``.
+"""
+import logging
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Optional
+
+from app.config import settings
+from app.instrumentation import RequestTimings, current_timings
+from app.metrics import REGISTRY
+
+
+logger = logging.getLogger(__name__)
+
+SLOW_STATEMENTS = REGISTRY.counter(
+    "db_slow_statements_total", "Statements slower than SLOW_QUERY_MS.", labelnames=("engine",)
+)
+QUERY_BUDGET_EXCEEDED = REGISTRY.counter(
+    "db_query_budget_exceeded_total",
+    "Requests over the statement budget or repeating one statement shape.",
+    labelnames=("reason",),
+)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(?:\?|%s|%\(\w+\)s|:\w+|\$\d+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+|\$\d+))*\s*\)")
+_SPACE = re.compile(r"\s+")
+# longest parameter list written to a slow statement log line
+MAX_LOGGED_PARAMETERS = 500
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised in strict mode when a request issues too many or repeated statements."""
+
+
+@dataclass
+class QueryLog:
+    """Statement shapes seen by one request, kept on its RequestTimings."""
+
+    shapes: Counter = field(default_factory=Counter)
+    reported: set = field(default_factory=set)
+
+
+def statement_shape(statement: str) -> str:
+    shape = _STRING_LITERAL.sub("?", statement)
+    shape = _NUMBER_LITERAL.sub("?", shape)
+    shape = _PLACEHOLDER_LIST.sub("(?)", shape)
+    return _SPACE.sub(" ", shape).strip()
+
+
+def explain(conn, statement: str, parameters) -> list[str]:
+    """Plan of ``statement``, asked for on a new cursor of the connection that ran it."""
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    # a raw DBAPI cursor, so the plan query does not pass through these hooks again
+    plan_cursor = conn.connection.cursor()
+    try:
+        plan_cursor.execute(prefix + statement, parameters or ())
+        return [" ".join(str(value) for value in row) for row in plan_cursor.fetchall()]
+    except Exception as e:  # the plan is a nice-to-have, never fail the query over it
+        return [f"EXPLAIN failed: {e}"]
+    finally:
+        plan_cursor.close()
+
+
+def _exceeded(timings: RequestTimings, reason: str, key: str, message: str) -> None:
+    log: QueryLog = timings.extra.setdefault("queries", QueryLog())
+    if key in log.reported:
+        return
+    log.reported.add(key)
+    QUERY_BUDGET_EXCEEDED.inc(reason=reason)
+    if settings.QUERY_DEBUG == "strict":
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+def check_statement(conn, statement: str, parameters, executemany: bool, seconds: float, engine: str) -> None:
+    """Called after every statement when QUERY_DEBUG is on."""
+    if seconds * 1000 >= settings.SLOW_QUERY_MS:
+        SLOW_STATEMENTS.inc(engine=engine)
+        plan = [] if executemany else explain(conn, statement, parameters)
+        logger.warning(
+            "slow statement (%.1f ms) on %s engine: %s\nparameters: %s\nplan:\n  %s",
+            seconds * 1000, engine, _SPACE.sub(" ", statement),
+            repr(parameters)[:MAX_LOGGED_PARAMETERS], "\n  ".join(plan) or "(none)",
+        )
+
+    timings = current_timings()
+    if timings is None:
+        return
+    log: QueryLog = timings.extra.setdefault("queries", QueryLog())
+    shape = statement_shape(statement)
+    log.shapes[shape] += 1
+    where = timings.label or "request"
+    if timings.db_statements > settings.QUERY_BUDGET:
+        _exceeded(
+            timings, "budget", "budget",
+            f"{where} ran more than {settings.QUERY_BUDGET} SQL statements (QUERY_BUDGET)",
+        )
+    if log.shapes[shape] > settings.QUERY_REPEAT_LIMIT:
+        _exceeded(
+            timings, "repeat", shape,
+            f"{where} ran the same statement more than {settings.QUERY_REPEAT_LIMIT} times, "
+            f"likely an N+1 query: {shape}",
+        )
+
+
+def statement_counts(timings: Optional[RequestTimings] = None) -> Counter:
+    """How often each statement shape has run in the current (or given) request."""
+    timings = timings or current_timings()
+    if timings is None or "queries" not in timings.extra:
+        return Counter()
+    return timings.extra["queries"].shapes
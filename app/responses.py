@@ -0,0 +1,29 @@
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from fastapi.responses import ORJSONResponse as _ORJSONResponse
+from pydantic import BaseModel
+
+
+def _default(obj: Any) -> Any:
+    # orjson handles dicts, lists, datetimes, UUIDs and enums itself; this is only
+    # called for the rest, mainly the SQLModel/pydantic objects routes return
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, Decimal):
+        return int(obj) if obj.as_tuple().exponent >= 0 else float(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class ORJSONResponse(_ORJSONResponse):
+    """JSON response rendered by orjson, accepting models directly.
+
+    Routes can put SQLModel/pydantic objects in ``content`` as they are,
+    without a ``jsonable_encoder`` pass first.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
@@ -0,0 +1,217 @@
+"""Turns a day's pending bookings into ordered pickup routes.
+
+Bookings are grouped by area and waste type (a truck carries one kind of
+waste). Each group is ordered into a tour by nearest neighbour, the tour is
+cut into routes of at most ``capacity`` stops, and every route is tidied up
+with 2-opt. Distances are straight-line kilometres on a local flat
+projection, which is accurate enough inside one city.
+
+Bookings without coordinates cannot be ordered by distance; they are sorted
+by address instead, so stops on the same street still end up together.
+"""
+import math
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+
+KM_PER_DEGREE_LATITUDE = 110.574
+KM_PER_DEGREE_LONGITUDE = 111.320
+# improvement passes per route; each pass is O(stops^2)
+TWO_OPT_PASSES = 3
+
+
+@dataclass(slots=True)
+class Stop:
+    booking_id: int
+    address: str
+    waste_type: str
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    area: str = ""
+
+
+@dataclass
+class Route:
+    vehicle: int
+    area: str
+    waste_type: str
+    stops: list[int] = field(default_factory=list)
+    # None when the stops have no coordinates
+    distance_km: Optional[float] = None
+
+
+def area_of(address: str) -> str:
+    """The area part of a free-form address: its last comma-separated component."""
+    parts = [part.strip() for part in address.split(",") if part.strip()]
+    if not parts:
+        return ""
+    return re.sub(r"\s+", " ", parts[-1]).lower()
+
+
+def _project(latitude: float, longitude: float, cos_latitude: float) -> tuple[float, float]:
+    return longitude * KM_PER_DEGREE_LONGITUDE * cos_latitude, latitude * KM_PER_DEGREE_LATITUDE
+
+
+class _Grid:
+    """Uniform grid over projected points for repeated nearest-unvisited lookups."""
+
+    def __init__(self, points: list[tuple[float, float]]):
+        self.points = points
+        xs = [x for x, _ in points]
+        ys = [y for _, y in points]
+        extent = max(max(xs) - min(xs), max(ys) - min(ys), 1e-6)
+        # about two points per cell
+        self.cell = max(extent / math.sqrt(max(len(points) / 2, 1)), 1e-6)
+        self.keys = [self._key(x, y) for x, y in points]
+        self.cells: dict[tuple[int, int], set[int]] = defaultdict(set)
+        for index, key in enumerate(self.keys):
+            self.cells[key].add(index)
+        self.remaining = set(range(len(points)))
+
+    def _key(self, x: float, y: float) -> tuple[int, int]:
+        return int(x // self.cell), int(y // self.cell)
+
+    def remove(self, index: int) -> None:
+        self.remaining.discard(index)
+        self.cells[self.keys[index]].discard(index)
+
+    def _ring(self, cx: int, cy: int, ring: int):
+        cells = self.cells
+        for i in range(cx - ring, cx + ring + 1):
+            yield cells.get((i, cy - ring), ())
+            yield cells.get((i, cy + ring), ())
+        for j in range(cy - ring + 1, cy + ring):
+            yield cells.get((cx - ring, j), ())
+            yield cells.get((cx + ring, j), ())
+
+    def nearest(self, x: float, y: float) -> int:
+        # squared distances throughout; only the order matters
+        points, cells = self.points, self.cells
+        cx, cy = self._key(x, y)
+        best, best_distance = -1, math.inf
+        # the 3x3 block around the point usually holds the answer
+        blocks = [cells.get((i, j), ()) for i in (cx - 1, cx, cx + 1) for j in (cy - 1, cy, cy + 1)]
+        ring, scanned_all = 1, False
+        while True:
+            for block in blocks:
+                for index in block:
+                    px, py = points[index]
+                    distance = (px - x) ** 2 + (py - y) ** 2
+                    if distance < best_distance:
+                        best, best_distance = index, distance
+            # anything outside the rings searched so far is at least ring * cell away
+            if scanned_all or best_distance <= (ring * self.cell) ** 2:
+                return best
+            ring += 1
+            # once a ring has more cells than points are left, a plain scan is cheaper
+            if 8 * ring > len(self.remaining):
+                blocks, scanned_all = [self.remaining], True
+            else:
+                blocks = self._ring(cx, cy, ring)
+
+
+def _nearest_neighbour_tour(points: list[tuple[float, float]], start: tuple[float, float]) -> list[int]:
+    grid = _Grid(points)
+    tour = []
+    x, y = start
+    while grid.remaining:
+        index = grid.nearest(x, y)
+        grid.remove(index)
+        tour.append(index)
+        x, y = points[index]
+    return tour
+
+
+def _two_opt(points: list[tuple[float, float]]) -> list[int]:
+    """Improve the open path through ``points`` (first point fixed); returns the new visiting order."""
+    count = len(points)
+    # routes are short, so a full distance matrix is cheap and keeps the inner loop to lookups
+    matrix = [[math.hypot(ax - bx, ay - by) for bx, by in points] for ax, ay in points]
+    nodes = list(range(count))
+    for _ in range(TWO_OPT_PASSES):
+        improved = False
+        for i in range(count - 2):
+            a, b = nodes[i], nodes[i + 1]
+            row_a, row_b = matrix[a], matrix[b]
+            ab = row_a[b]
+            for j in range(i + 2, count):
+                c = nodes[j]
+                if j + 1 < count:
+                    delta = row_a[c] + row_b[nodes[j + 1]] - ab - matrix[c][nodes[j + 1]]
+                else:
+                    # open end: reversing the tail only changes the first edge
+                    delta = row_a[c] - ab
+                if delta < -1e-9:
+                    nodes[i + 1:j + 1] = reversed(nodes[i + 1:j + 1])
+                    b = nodes[i + 1]
+                    row_b = matrix[b]
+                    ab = row_a[b]
+                    improved = True
+        if not improved:
+            break
+    return nodes
+
+
+def _path_length(points: list[tuple[float, float]]) -> float:
+    return sum(math.hypot(x2 - x1, y2 - y1) for (x1, y1), (x2, y2) in zip(points, points[1:]))
+
+
+def _plan_group(
+    stops: list[Stop],
+    capacity: int,
+    depot: Optional[tuple[float, float]],
+) -> list[tuple[list[int], Optional[float]]]:
+    located = [stop for stop in stops if stop.latitude is not None and stop.longitude is not None]
+    unlocated = sorted(
+        (stop for stop in stops if stop.latitude is None or stop.longitude is None),
+        key=lambda stop: (stop.address.lower(), stop.booking_id),
+    )
+    routes: list[tuple[list[int], Optional[float]]] = []
+
+    if located:
+        reference = depot[0] if depot else sum(stop.latitude for stop in located) / len(located)
+        cos_latitude = math.cos(math.radians(reference))
+        points = [_project(stop.latitude, stop.longitude, cos_latitude) for stop in located]
+        if depot:
+            start = _project(depot[0], depot[1], cos_latitude)
+        else:
+            start = min(points, key=lambda point: point[0] + point[1])
+        tour = _nearest_neighbour_tour(points, start)
+        for offset in range(0, len(tour), capacity):
+            chunk = tour[offset:offset + capacity]
+            # the start point goes first so 2-opt keeps it there
+            path = [start] + [points[index] for index in chunk]
+            order = _two_opt(path)[1:]
+            chunk = [chunk[position - 1] for position in order]
+            distance = _path_length([path[position] for position in [0] + order])
+            routes.append(([located[index].booking_id for index in chunk], round(distance, 3)))
+
+    for offset in range(0, len(unlocated), capacity):
+        routes.append(([stop.booking_id for stop in unlocated[offset:offset + capacity]], None))
+    return routes
+
+
+def plan_routes(
+    stops: Iterable[Stop],
+    capacity: int,
+    depot: Optional[tuple[float, float]] = None,
+) -> list[Route]:
+    """Plan pickup routes of at most ``capacity`` stops, one waste type and area per route.
+
+    ``depot`` is the (latitude, longitude) trucks leave from; without it each
+    group starts at its south-westernmost stop. Routes are numbered in order
+    as vehicles.
+    """
+    if capacity < 1:
+        raise ValueError("capacity must be at least 1")
+    groups: dict[tuple[str, str], list[Stop]] = defaultdict(list)
+    for stop in stops:
+        groups[(stop.area or area_of(stop.address), stop.waste_type)].append(stop)
+
+    routes = []
+    for (area, waste_type), members in sorted(groups.items()):
+        for booking_ids, distance in _plan_group(members, capacity, depot):
+            routes.append(Route(len(routes) + 1, area, waste_type, booking_ids, distance))
+    return routes
@@ -0,0 +1,117 @@
+import os
+import re
+from email.utils import formatdate
+
+import anyio
+from fastapi import HTTPException, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from fastapi.staticfiles import StaticFiles
+
+
+# <32 hex chars of sha256>[_<size>].<ext>, as written by app.images.generate_variants
+CONTENT_ADDRESSED_NAME = re.compile(r"^(?P<digest>[0-9a-f]{32})(_(?P<size>\d+))?\.[a-z]+$")
+IMMUTABLE = "public, max-age=31536000, immutable"
+RANGE_CHUNK_SIZE = 64 * 1024
+
+
+def content_addressed_etag(path: str) -> str | None:
+    """Strong ETag derived from a content-hashed file name, or None for other files."""
+    match = CONTENT_ADDRESSED_NAME.match(os.path.basename(path))
+    if match is None:
+        return None
+    return f'"{os.path.splitext(os.path.basename(path))[0]}"'
+
+
+class ProfilePictureFiles(StaticFiles):
+    """StaticFiles that lets clients cache content-hashed pictures forever."""
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if content_addressed_etag(str(full_path)) is not None:
+            response.headers["Cache-Control"] = IMMUTABLE
+        return response
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    candidates = [value.strip().removeprefix("W/") for value in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """Parse a single ``bytes=`` range into inclusive offsets.
+
+    Returns None for anything we do not serve partially (multiple ranges,
+    other units or an invalid range such as 5-3), in which case the whole
+    file is sent.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    start, _, end = spec.strip().partition("-")
+    try:
+        if not start:
+            length = int(end)
+            if length <= 0:
+                raise ValueError
+            first, last = max(size - length, 0), size - 1
+        else:
+            first = int(start)
+            last = int(end) if end else size - 1
+            if end and last < first:
+                # syntactically invalid, so the header is ignored (RFC 9110, 14.2)
+                raise ValueError
+            last = min(last, size - 1)
+    except ValueError:
+        return None
+    if first >= size:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return first, last
+
+
+async def _read_range(path: str, first: int, last: int):
+    async with await anyio.open_file(path, "rb") as file_object:
+        await file_object.seek(first)
+        remaining = last - first + 1
+        while remaining > 0:
+            chunk = await file_object.read(min(RANGE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+async def file_response(request: Request, path: str, cache_control: str = "private, no-cache") -> Response:
+    """Serve ``path`` with ETag / If-None-Match revalidation and single-range support."""
+    stat_result = await anyio.to_thread.run_sync(os.stat, path)
+    etag = content_addressed_etag(path) or f'"{int(stat_result.st_mtime):x}-{stat_result.st_size:x}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat_result.st_mtime, usegmt=True),
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range == etag):
+        byte_range = parse_range(range_header, stat_result.st_size)
+        if byte_range is not None:
+            first, last = byte_range
+            headers["Content-Range"] = f"bytes {first}-{last}/{stat_result.st_size}"
+            headers["Content-Length"] = str(last - first + 1)
+            return StreamingResponse(
+                _read_range(path, first, last),
+                status_code=206,
+                headers=headers,
+                media_type=FileResponse(path).media_type,
+            )
+
+    return FileResponse(path, headers=headers, stat_result=stat_result)
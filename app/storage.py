@@ -0,0 +1,115 @@
+import mimetypes
+import os
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.client import Config
+from botocore.exceptions import ClientError
+
+from app.config import settings
+from app.static import IMMUTABLE
+
+
+class LocalStorage:
+    """Keeps files in a directory on this node, served by the /profile_pictures mount."""
+
+    def __init__(self, directory: str):
+        self.directory = os.path.join(".", directory)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def save(self, local_path: str) -> str:
+        """Move ``local_path`` into storage under its file name and return its reference."""
+        target = self.path(os.path.basename(local_path))
+        if os.path.abspath(local_path) != os.path.abspath(target):
+            os.replace(local_path, target)
+        return target
+
+    def exists(self, name: str) -> bool:
+        return os.path.exists(self.path(name))
+
+    def url(self, name: str) -> str | None:
+        # no URL of our own: the API streams local files itself
+        return None
+
+    def delete(self, name: str) -> None:
+        try:
+            os.unlink(self.path(name))
+        except FileNotFoundError:
+            pass
+
+
+class S3Storage:
+    """Stores files in an S3-compatible bucket (AWS, MinIO, ...) and hands out presigned URLs.
+
+    Files above S3_MULTIPART_THRESHOLD are sent as a multipart upload. The
+    boto3 client is blocking, so callers run these methods in the threadpool.
+    """
+
+    def __init__(self, bucket: str, prefix: str):
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self._client = None
+        self.transfer_config = TransferConfig(
+            multipart_threshold=settings.S3_MULTIPART_THRESHOLD,
+            multipart_chunksize=settings.S3_MULTIPART_CHUNKSIZE,
+        )
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = boto3.client(
+                "s3",
+                endpoint_url=settings.S3_ENDPOINT_URL,
+                region_name=settings.S3_REGION,
+                aws_access_key_id=settings.S3_ACCESS_KEY_ID,
+                aws_secret_access_key=settings.S3_SECRET_ACCESS_KEY,
+                config=Config(signature_version="s3v4"),
+            )
+        return self._client
+
+    def key(self, name: str) -> str:
+        return f"{self.prefix}/{name}" if self.prefix else name
+
+    def save(self, local_path: str) -> str:
+        """Upload ``local_path`` under its file name, remove the local copy and return the key."""
+        name = os.path.basename(local_path)
+        content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        self.client.upload_file(
+            local_path,
+            self.bucket,
+            self.key(name),
+            ExtraArgs={"ContentType": content_type, "CacheControl": IMMUTABLE},
+            Config=self.transfer_config,
+        )
+        os.unlink(local_path)
+        return self.key(name)
+
+    def exists(self, name: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.key(name))
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                return False
+            raise
+        return True
+
+    def url(self, name: str) -> str | None:
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": self.key(name)},
+            ExpiresIn=settings.S3_PRESIGN_EXPIRE_SECONDS,
+        )
+
+    def delete(self, name: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self.key(name))
+
+
+def get_storage():
+    if settings.STORAGE_BACKEND == "s3":
+        return S3Storage(settings.S3_BUCKET, settings.S3_PREFIX)
+    return LocalStorage(settings.PROFILE_PICTURE_DIR)
+
+
+profile_pictures = get_storage()
@@ -0,0 +1,28 @@
+from pathlib import Path
+from typing import Any, Iterable
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+from app.config import settings
+
+
+TEMPLATES_DIR = Path(__file__).parent / "email-templates"
+
+# Templates are compiled once per process and kept in memory; the bytecode
+# cache lets new workers skip compiling as well. Only local development
+# re-checks the files for edits.
+environment = Environment(
+    loader=FileSystemLoader(TEMPLATES_DIR),
+    bytecode_cache=FileSystemBytecodeCache(settings.EMAIL_TEMPLATE_CACHE_DIR),
+    auto_reload=settings.ENVIRONMENT == "local",
+)
+
+
+def render(template_name: str, context: dict[str, Any]) -> str:
+    return environment.get_template(template_name).render(context)
+
+
+def render_many(template_name: str, contexts: Iterable[dict[str, Any]]) -> list[str]:
+    """Render one template for many recipients, looking it up only once."""
+    template = environment.get_template(template_name)
+    return [template.render(context) for context in contexts]
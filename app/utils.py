@@ -3,6 +3,7 @@ from datetime import datetime, timedelta
 from typing import Any
 
 from app.config import settings
+from app.cache import TTLCache
 from jose import jwt, JWTError
 
 from passlib.context import CryptContext
@@ -10,14 +11,19 @@ from app.models import TokenData
 
 from pydantic import ValidationError
 from fastapi import HTTPException, status, Depends, UploadFile
+from fastapi.concurrency import run_in_threadpool
 from dataclasses import dataclass
-from jinja2 import Template
+from app import templating
 
 from pathlib import Path
 import emails 
 import os
-import uuid
-from PIL import Image
+import tempfile
+import time
+from app.images import image_processor, variant_path
+from app.instrumentation import JWT_SECONDS, timed_phase
+from app.log import auth_logger
+from app.storage import profile_pictures
 
 
 
@@ -27,6 +33,11 @@ from PIL import Image
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bearer token -> TokenData, so repeat requests with the same token skip jwt.decode
+token_cache = TTLCache(
+    "token", maxsize=settings.TOKEN_CACHE_MAX_SIZE, ttl=settings.TOKEN_CACHE_TTL_SECONDS
+)
+
 @dataclass
 class EmailData:
     html_content: str
@@ -37,7 +48,8 @@ class EmailData:
 def create_access_token(subject: str | Any, expires_delta: timedelta) -> str: #subject what we want to encode, expires_delta when the token will expire
     expire = datetime.utcnow() + expires_delta
     to_encode = {"exp": expire, "sub": str(subject)}
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    with timed_phase("jwt", JWT_SECONDS, operation="encode"):
+        encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
 def create_token(subject: str | Any, type_ops: str):
@@ -52,22 +64,32 @@ def create_token(subject: str | Any, type_ops: str):
         hours=hours
     )
     to_encode = {"exp": expire, "sub": str(subject)}
-    encoded_jwt = jwt.encode(
-        to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM
-    )
+    with timed_phase("jwt", JWT_SECONDS, operation="encode"):
+        encoded_jwt = jwt.encode(
+            to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM
+        )
     return encoded_jwt
 
 
 def verify_token_access(token: str):
+    token_data = token_cache.get(token)
+    if token_data is not None:
+        return token_data
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=settings.ALGORITHM)
+        with timed_phase("jwt", JWT_SECONDS, operation="decode"):
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=settings.ALGORITHM)
         token_data = TokenData(**payload)
     except (JWTError, ValidationError) as e:
-        print(e)
+        # never log the token itself
+        reason = str(e) if isinstance(e, JWTError) else "invalid claims"
+        auth_logger.warning("access token rejected", extra={"reason": reason})
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
+    # never serve a cached token past its own expiry
+    expires_in = payload["exp"] - time.time() if "exp" in payload else None
+    token_cache.set(token, token_data, ttl=expires_in)
     return token_data
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -79,19 +101,16 @@ def get_password_hash(password: str) -> str:
 
 def verify_token(token: str) -> str | None:
     try:
-        decoded_token = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=settings.ALGORITHM
-        )  # noqa
-        print(decoded_token, "decoded_token")
+        with timed_phase("jwt", JWT_SECONDS, operation="decode"):
+            decoded_token = jwt.decode(
+                token, settings.SECRET_KEY, algorithms=settings.ALGORITHM
+            )  # noqa
         return str(decoded_token["sub"])
-    except JWTError:
+    except JWTError as e:
+        auth_logger.warning("token rejected", extra={"reason": str(e)})
         return None
 def render_email_template(*, template_name: str, context: dict[str, Any]) -> str:
-    template_str = (
-        Path(__file__).parent / "email-templates" / template_name
-    ).read_text()
-    html_content = Template(template_str).render(context)
-    return html_content
+    return templating.render(template_name, context)
 
 def generate_verification_email(email_to: str, email: str, token: str):
     project_name = settings.PROJECT_NAME
@@ -156,23 +175,64 @@ def create_reset_password_token(email:str):
 def get_image_url(image_filename: str):
     return f"/profile_pictures/{image_filename}"
 
-def validate_picture(picture: UploadFile):
-    if not picture.filename.lower().endswith(('.jpg', '.jpeg', '.png')):
-        raise HTTPException(status_code=400, detail="Please upload a picture in JPEG, JPG or PNG format.")
+PICTURE_CHUNK_SIZE = 64 * 1024
+# leading bytes of each accepted format -> extension it is stored under
+PICTURE_SIGNATURES = {
+    b"\xff\xd8\xff": "jpg",
+    b"\x89PNG\r\n\x1a\n": "png",
+}
+
 
-def save_profile_picture(picture: UploadFile):
-    contents = picture.file.read()
-    if len(contents) > 10 * 1024 * 1024:  # 10 MB limit
-        raise HTTPException(status_code=400, detail="File size exceeds limit (10MB).")
+def detect_picture_type(head: bytes) -> str | None:
+    for signature, extension in PICTURE_SIGNATURES.items():
+        if head.startswith(signature):
+            return extension
+    return None
 
-    file_extension = picture.filename.split(".")[-1]
-    unique_filename = f"{uuid.uuid4()}.{file_extension}"
-    upload_folder = "./profile_pictures"
-    file_path = os.path.join(upload_folder, unique_filename)
 
+def _receive_profile_picture(source, upload_folder: str, max_bytes: int) -> str:
+    """Copy the upload into a temp file in ``upload_folder`` and return its path."""
     os.makedirs(upload_folder, exist_ok=True)
-    with open(file_path, "wb") as file_object:
-        file_object.write(contents)
-    
-    return file_path 
+    fd, temp_path = tempfile.mkstemp(dir=upload_folder, prefix=".upload-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file_object:
+            head = source.read(PICTURE_CHUNK_SIZE)
+            if detect_picture_type(head) is None:
+                raise HTTPException(status_code=400, detail="Please upload a picture in JPEG, JPG or PNG format.")
+            size = 0
+            chunk = head
+            while chunk:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=400, detail=f"File size exceeds limit ({max_bytes // (1024 * 1024)}MB).")
+                file_object.write(chunk)
+                chunk = source.read(PICTURE_CHUNK_SIZE)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return temp_path
+
+
+async def save_profile_picture(picture: UploadFile) -> str:
+    """Stream the upload to disk in chunks, off the event loop, enforcing the size limit as it goes.
+
+    The raw upload is then re-encoded without EXIF, together with its
+    thumbnails, and only that cleaned copy is kept. The files are staged in
+    PROFILE_PICTURE_DIR and then handed to the configured storage backend.
+    """
+    upload_folder = os.path.join(".", settings.PROFILE_PICTURE_DIR)
+    temp_path = await run_in_threadpool(
+        _receive_profile_picture,
+        picture.file,
+        upload_folder,
+        settings.PROFILE_PICTURE_MAX_BYTES,
+    )
+    try:
+        original_path = await image_processor.create_variants(temp_path, upload_folder)
+    finally:
+        os.unlink(temp_path)
+    # thumbnails first, so a stored original always has its thumbnails
+    for size in settings.PROFILE_PICTURE_SIZES:
+        await run_in_threadpool(profile_pictures.save, variant_path(original_path, str(size)))
+    return await run_in_threadpool(profile_pictures.save, original_path)
     
@@ -0,0 +1,56 @@
+"""Serialization throughput of a list of bookings: jsonable_encoder + JSONResponse vs ORJSONResponse.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_json_response [bookings] [iterations]
+"""
+import sys
+import timeit
+import uuid
+from datetime import date, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.models import Waste
+from app.responses import ORJSONResponse
+
+
+def make_bookings(count: int) -> list[Waste]:
+    user_id = uuid.uuid4()
+    return [
+        Waste(
+            id=i,
+            user_id=user_id,
+            first_name="Jonah",
+            last_name="Onah",
+            phone="+2348103896322",
+            address=f"{i} Admiralty Way, Lekki",
+            pickup_date=date(2024, 1, 1) + timedelta(days=i % 365),
+            waste_type="Plastic",
+            amount=1000 + i,
+        )
+        for i in range(count)
+    ]
+
+
+def main(count: int = 100, iterations: int = 200) -> None:
+    bookings = make_bookings(count)
+
+    def before():
+        JSONResponse(content={"items": jsonable_encoder(bookings), "next_cursor": None})
+
+    def after():
+        ORJSONResponse(content={"items": bookings, "next_cursor": None})
+
+    old = min(timeit.repeat(before, number=iterations, repeat=3)) / iterations
+    new = min(timeit.repeat(after, number=iterations, repeat=3)) / iterations
+
+    print(f"bookings per response     : {count}")
+    print(f"jsonable_encoder + json   : {old * 1e3:8.3f} ms/response ({count / old:10.0f} bookings/s)")
+    print(f"ORJSONResponse            : {new * 1e3:8.3f} ms/response ({count / new:10.0f} bookings/s)")
+    print(f"speedup                   : {old / new:.1f}x")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
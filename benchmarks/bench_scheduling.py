@@ -0,0 +1,48 @@
+"""Planning time of app.scheduling.plan_routes for 1k, 10k and 100k pending bookings.
+
+Stops are spread over a Lagos-sized box in a handful of areas and waste
+types. Run from the repository root:
+
+    python -m benchmarks.bench_scheduling [capacity]
+"""
+import random
+import sys
+import time
+
+from app.models import WasteType
+from app.scheduling import Stop, plan_routes
+
+
+AREAS = ["Lekki", "Ikeja", "Yaba", "Surulere", "Ikoyi", "Ajah", "Gbagada", "Festac"]
+DEPOT = (6.5244, 3.3792)
+
+
+def make_stops(count: int, located: bool = True, seed: int = 1) -> list[Stop]:
+    rng = random.Random(seed)
+    stops = []
+    for booking_id in range(1, count + 1):
+        area = rng.choice(AREAS)
+        stops.append(Stop(
+            booking_id=booking_id,
+            address=f"{rng.randint(1, 300)} Street {rng.randint(1, 50)}, {area}",
+            waste_type=rng.choice(list(WasteType)).value,
+            latitude=rng.uniform(6.40, 6.70) if located else None,
+            longitude=rng.uniform(3.10, 3.60) if located else None,
+        ))
+    return stops
+
+
+def main(capacity: int = 20) -> None:
+    print(f"{'bookings':>9} {'coords':>7} {'routes':>7} {'km':>10} {'seconds':>8}")
+    for count in (1_000, 10_000, 100_000):
+        for located in (True, False):
+            stops = make_stops(count, located)
+            started = time.perf_counter()
+            routes = plan_routes(stops, capacity, DEPOT if located else None)
+            elapsed = time.perf_counter() - started
+            distance = sum(route.distance_km or 0 for route in routes)
+            print(f"{count:>9} {'yes' if located else 'no':>7} {len(routes):>7} {distance:>10.0f} {elapsed:>8.3f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,35 @@
+"""Per-request cost of ``verify_token_access`` with and without the token cache.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_token_cache [iterations]
+"""
+import sys
+import timeit
+import uuid
+
+from app.utils import create_token, token_cache, verify_token_access
+
+
+def main(iterations: int = 20000) -> None:
+    token = create_token(subject=uuid.uuid4(), type_ops="access")
+
+    def uncached():
+        token_cache.clear()
+        verify_token_access(token)
+
+    def cached():
+        verify_token_access(token)
+
+    cold = min(timeit.repeat(uncached, number=iterations, repeat=3)) / iterations
+    verify_token_access(token)
+    warm = min(timeit.repeat(cached, number=iterations, repeat=3)) / iterations
+
+    print(f"iterations per run : {iterations}")
+    print(f"decode every call  : {cold * 1e6:8.2f} us/request")
+    print(f"cached token       : {warm * 1e6:8.2f} us/request")
+    print(f"saved per request  : {(cold - warm) * 1e6:8.2f} us ({cold / warm:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
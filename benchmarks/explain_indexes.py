@@ -0,0 +1,69 @@
+"""Check with EXPLAIN that the per-user, per-status and proximity booking queries use their indexes.
+
+Runs against DATABASE_URL (tables must exist, e.g. after ``alembic upgrade head``)
+and exits non-zero if any query falls back to a full table scan:
+
+    python -m benchmarks.explain_indexes
+"""
+import sys
+import uuid
+from datetime import date
+
+from sqlalchemy import text
+from sqlmodel import select
+
+from app.db import engine
+from app.geocoding import within_clause
+from app.models import BookingStatus, Review, Waste
+
+
+def queries():
+    user_id = uuid.uuid4()
+    return {
+        "bookings by user": (
+            select(Waste).where(Waste.user_id == user_id).order_by(Waste.pickup_date),
+            "ix_waste_user_id_pickup_date",
+        ),
+        "reviews by user": (
+            select(Review).where(Review.user_id == user_id),
+            "ix_review_user_id",
+        ),
+        "pending bookings for a day": (
+            select(Waste).where(
+                Waste.order_status == BookingStatus.pending, Waste.pickup_date == date.today()
+            ),
+            "ix_waste_order_status_pickup_date",
+        ),
+        "bookings near a point": (
+            select(Waste).where(within_clause(6.5244, 3.3792, 5)),
+            "ix_waste_geohash",
+        ),
+    }
+
+
+def explain(connection, statement) -> str:
+    compiled = statement.compile(connection, compile_kwargs={"literal_binds": True})
+    if connection.dialect.name == "sqlite":
+        rows = connection.execute(text(f"EXPLAIN QUERY PLAN {compiled}")).all()
+        return "\n".join(str(row[-1]) for row in rows)
+    rows = connection.execute(text(f"EXPLAIN {compiled}")).all()
+    return "\n".join(str(row[0]) for row in rows)
+
+
+def main() -> int:
+    failures = 0
+    with engine.connect() as connection:
+        if connection.dialect.name == "postgresql":
+            # small tables make the planner prefer a scan; we only care that the index is usable
+            connection.execute(text("SET enable_seqscan = off"))
+        for name, (statement, index_name) in queries().items():
+            plan = explain(connection, statement)
+            ok = index_name in plan
+            failures += not ok
+            print(f"[{'ok' if ok else 'FAIL'}] {name} -> expected {index_name}")
+            print("    " + plan.replace("\n", "\n    "))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
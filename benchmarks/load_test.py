@@ -0,0 +1,288 @@
+"""Load test of the API in-process, over httpx's ASGI transport.
+
+Seeds a scratch database (see benchmarks.seed), then runs each scenario
+with a fixed number of requests spread over ``--concurrency`` concurrent
+clients, and reports p50/p95/p99 latency and requests per second. Results
+are written as JSON; if a baseline file exists, every scenario is compared
+to it and the run exits with status 1 when one got slower than the
+tolerance allows. Run from the repository root:
+
+    python -m benchmarks.load_test                     # seed, run, compare
+    python -m benchmarks.load_test --save-baseline     # record the reference run
+    python -m benchmarks.load_test --scenarios login,booking_list --requests 500
+
+There is no network or server process in the way, so the numbers measure
+the application, its database and bcrypt, not uvicorn. The default
+database is a local SQLite file that is dropped and recreated on every run.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Awaitable, Callable
+
+
+RESULTS_DIR = Path(__file__).parent / "results"
+DEFAULT_OUTPUT = RESULTS_DIR / "latest.json"
+DEFAULT_BASELINE = RESULTS_DIR / "baseline.json"
+# latency differences below this are noise at any tolerance
+REGRESSION_FLOOR_MS = 1.0
+SCENARIOS = (
+    "login",
+    "booking_create",
+    "booking_list",
+    "review_create",
+    "review_list",
+    "review_update",
+    "review_delete",
+    "admin_users",
+)
+
+
+def percentile(ordered: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    rank = max(int(round(fraction * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def summarize(latencies: list[float], errors: int, wall: float) -> dict:
+    ordered = sorted(latencies)
+    count = len(ordered)
+    return {
+        "requests": count,
+        "errors": errors,
+        "requests_per_second": round(count / wall, 1) if wall else 0.0,
+        "mean_ms": round(sum(ordered) / count * 1e3, 3) if count else 0.0,
+        "p50_ms": round(percentile(ordered, 0.50) * 1e3, 3),
+        "p95_ms": round(percentile(ordered, 0.95) * 1e3, 3),
+        "p99_ms": round(percentile(ordered, 0.99) * 1e3, 3),
+        "max_ms": round(ordered[-1] * 1e3, 3) if count else 0.0,
+    }
+
+
+async def run_scenario(count: int, concurrency: int, send: Callable[[int], Awaitable]) -> dict:
+    """Issue ``send(0) .. send(count - 1)`` from ``concurrency`` workers and time each call."""
+    latencies: list[float] = []
+    errors = 0
+    indexes = iter(range(count))
+
+    async def worker():
+        nonlocal errors
+        for index in indexes:
+            started = time.perf_counter()
+            response = await send(index)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Human-readable regressions of ``current`` against ``baseline``."""
+    regressions = []
+    for name, result in current["scenarios"].items():
+        reference = baseline.get("scenarios", {}).get(name)
+        if reference is None:
+            continue
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            limit = reference[key] * (1 + tolerance)
+            if result[key] > limit and result[key] - reference[key] > REGRESSION_FLOOR_MS:
+                regressions.append(f"{name}: {key} {result[key]:.1f} > {reference[key]:.1f} (+{tolerance:.0%})")
+        if result["requests_per_second"] < reference["requests_per_second"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: requests/s {result['requests_per_second']:.1f} < "
+                f"{reference['requests_per_second']:.1f} (-{tolerance:.0%})"
+            )
+        if result["errors"] > reference["errors"]:
+            regressions.append(f"{name}: {result['errors']} errors, baseline had {reference['errors']}")
+    return regressions
+
+
+async def run(args: argparse.Namespace) -> dict:
+    # the app reads its settings at import time, so these run only after
+    # main() has pointed DATABASE_URL at the scratch database
+    import httpx
+    from sqlmodel import create_engine, select, Session
+
+    from app.models import User
+    from app.utils import create_access_token
+    from benchmarks.seed import SEED_PASSWORD, seed, seed_email
+    from main import app
+
+    engine = create_engine(args.database_url)
+    counts = seed(engine, args.users, args.bookings_per_user, args.reviews_per_user)
+    with Session(engine) as session:
+        emails = [seed_email(index) for index in range(min(args.users, args.concurrency))]
+        user_ids = session.exec(select(User.id).where(User.email.in_(emails)).order_by(User.email)).all()
+        staff_id = session.exec(select(User.id).where(User.email == seed_email(0))).one()
+    engine.dispose()
+
+    # tokens are minted directly; the login scenario is what measures login
+    headers = [{"Authorization": f"Bearer {create_access_token(user_id, timedelta(hours=1))}"} for user_id in user_ids]
+    staff_headers = {"Authorization": f"Bearer {create_access_token(staff_id, timedelta(hours=1))}"}
+    prefix = "/api/v1"
+    created_reviews: list[tuple[dict, int]] = []
+
+    await app.router.startup()
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+
+            async def login(index):
+                return await client.post(f"{prefix}/login", data={
+                    "username": seed_email(index % args.users), "password": SEED_PASSWORD,
+                })
+
+            async def booking_create(index):
+                return await client.post(f"{prefix}/bookings/booking", headers=headers[index % len(headers)], json={
+                    "first_name": "Bench",
+                    "last_name": "User",
+                    "phone": "+2348103896322",
+                    "address": f"{index % 300 + 1} Admiralty Way, Lekki",
+                    "pickup_date": (date.today() + timedelta(days=index % 30 + 1)).isoformat(),
+                    "waste_type": "Plastic",
+                })
+
+            async def booking_list(index):
+                return await client.get(f"{prefix}/bookings/booking", headers=headers[index % len(headers)])
+
+            async def review_create(index):
+                user_headers = headers[index % len(headers)]
+                response = await client.post(f"{prefix}/reviews/review", headers=user_headers, params={
+                    "comment": f"Benchmark review {index}", "reviewer_name": "Bench", "rating": index % 5 + 1,
+                })
+                if response.is_success:
+                    created_reviews.append((user_headers, response.json()["created_review"]["id"]))
+                return response
+
+            async def review_list(index):
+                return await client.get(f"{prefix}/reviews/review/", headers=headers[index % len(headers)])
+
+            async def review_update(index):
+                user_headers, review_id = created_reviews[index % len(created_reviews)]
+                return await client.put(f"{prefix}/reviews/review/{review_id}/", headers=user_headers, params={
+                    "comment": f"Updated benchmark review {index}", "rating": 5,
+                })
+
+            async def review_delete(index):
+                user_headers, review_id = created_reviews[index]
+                return await client.delete(f"{prefix}/reviews/review/{review_id}/", headers=user_headers)
+
+            async def admin_users(index):
+                return await client.get(f"{prefix}/admin/users/", headers=staff_headers)
+
+            senders = {
+                "login": login,
+                "booking_create": booking_create,
+                "booking_list": booking_list,
+                "review_create": review_create,
+                "review_list": review_list,
+                "review_update": review_update,
+                "review_delete": review_delete,
+                "admin_users": admin_users,
+            }
+            for name in args.scenarios:
+                count = args.requests
+                if name in ("review_update", "review_delete"):
+                    if not created_reviews:
+                        print(f"{name}: skipped, needs review_create to run first", file=sys.stderr)
+                        continue
+                    if name == "review_delete":
+                        count = len(created_reviews)
+                results[name] = await run_scenario(count, args.concurrency, senders[name])
+    finally:
+        await app.router.shutdown()
+
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "database": args.database_url.partition("://")[0],
+        "seeded": counts,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "scenarios": results,
+    }
+
+
+def print_report(report: dict) -> None:
+    print(f"{'scenario':<15} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, result in report["scenarios"].items():
+        print(
+            f"{name:<15} {result['requests']:>8} {result['errors']:>6} {result['requests_per_second']:>8.1f} "
+            f"{result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f}"
+        )
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default="sqlite:///benchmark.sqlite",
+                        help="scratch database; its tables are dropped and recreated")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--bookings-per-user", type=int, default=20)
+    parser.add_argument("--reviews-per-user", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"comma-separated subset of {', '.join(SCENARIOS)}")
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown against the baseline, as a fraction")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    args = parser.parse_args(argv)
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    # keep the order scenarios depend on (create before update before delete)
+    args.scenarios = [name for name in SCENARIOS if name in args.scenarios]
+    return args
+
+
+def main(argv: list[str]) -> int:
+    args = parse_args(argv)
+    os.environ["DATABASE_URL"] = args.database_url
+    # nothing here sends mail; avoid needing SMTP settings from .env
+    for name, value in (("SMTP_HOST", "localhost"), ("SMTP_USER", "bench"), ("SMTP_PASSWORD", "bench")):
+        os.environ.setdefault(name, value)
+    os.environ.setdefault("EMAIL_BACKEND", "console")
+
+    report = asyncio.run(run(args))
+    print_report(report)
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(report, indent=2))
+    print(f"results written to {args.output}")
+
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(report, indent=2))
+        print(f"baseline written to {args.baseline}")
+        return 0
+    if not args.baseline.exists():
+        print(f"no baseline at {args.baseline}; run with --save-baseline to record one")
+        return 0
+
+    regressions = compare(report, json.loads(args.baseline.read_text()), args.tolerance)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if not regressions:
+        print(f"no regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,146 @@
+"""Fill a database with synthetic users, bookings and reviews for benchmarking.
+
+Every seeded user has the password ``SEED_PASSWORD`` and the email
+``bench{n}@example.com``; user 0 is staff. Rows are generated from a fixed
+random seed, so two runs at the same scale produce the same data. The
+tables are dropped and recreated first, so never point this at a database
+you care about. Run from the repository root:
+
+    python -m benchmarks.seed sqlite:///benchmark.sqlite [users] [bookings_per_user] [reviews_per_user]
+"""
+import random
+import sys
+import time
+import uuid
+from datetime import date, timedelta
+
+from sqlalchemy import insert
+from sqlalchemy.engine import Engine
+from sqlmodel import SQLModel, create_engine
+
+from app.geocoding import location_fields
+from app.models import Amount, BookingStatus, Review, User, Waste, WasteType
+from app.utils import get_password_hash
+
+
+SEED_PASSWORD = "Bench@12345"
+AREAS = {
+    "Lekki": (6.4474, 3.4723),
+    "Ikeja": (6.6018, 3.3515),
+    "Yaba": (6.5095, 3.3711),
+    "Surulere": (6.5000, 3.3500),
+    "Ikoyi": (6.4541, 3.4347),
+    "Ajah": (6.4698, 3.5852),
+}
+AMOUNTS = {
+    WasteType.organic_waste: Amount.organic_waste,
+    WasteType.plastic_waste: Amount.plastic_waste,
+    WasteType.medical_waste: Amount.medical_waste,
+    WasteType.industrial_waste: Amount.industrial_waste,
+}
+BATCH_SIZE = 5000
+
+
+def seed_email(index: int) -> str:
+    return f"bench{index}@example.com"
+
+
+def _batches(rows, size: int = BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def seed(
+    engine: Engine,
+    users: int = 100,
+    bookings_per_user: int = 20,
+    reviews_per_user: int = 5,
+    random_seed: int = 1,
+) -> dict[str, int]:
+    """Recreate the tables behind ``engine`` and fill them; returns the row counts."""
+    rng = random.Random(random_seed)
+    # bcrypt is deliberately slow, so every user shares one hash
+    password = get_password_hash(SEED_PASSWORD)
+    user_ids = [uuid.UUID(int=rng.getrandbits(128), version=4) for _ in range(users)]
+    first_day = date.today()
+
+    def user_rows():
+        for index, user_id in enumerate(user_ids):
+            yield {
+                "id": user_id,
+                "first_name": f"Bench{index}",
+                "last_name": "User",
+                "email": seed_email(index),
+                "phone_number": "tel:+234-810-389-6322",
+                "password": password,
+                "is_staff": index == 0,
+                "is_active": True,
+            }
+
+    def booking_rows():
+        for index, user_id in enumerate(user_ids):
+            for _ in range(bookings_per_user):
+                area, (latitude, longitude) = rng.choice(list(AREAS.items()))
+                waste_type = rng.choice(list(WasteType))
+                coordinates = (
+                    round(latitude + rng.uniform(-0.02, 0.02), 6),
+                    round(longitude + rng.uniform(-0.02, 0.02), 6),
+                )
+                yield {
+                    "user_id": user_id,
+                    "first_name": f"Bench{index}",
+                    "last_name": "User",
+                    "phone": "tel:+234-810-389-6322",
+                    "address": f"{rng.randint(1, 300)} Street {rng.randint(1, 50)}, {area}",
+                    "pickup_date": first_day + timedelta(days=rng.randint(-30, 60)),
+                    "waste_type": waste_type,
+                    "amount": AMOUNTS[waste_type],
+                    "order_status": rng.choice(list(BookingStatus)),
+                    "delivery_status": False,
+                    **location_fields(coordinates),
+                }
+
+    def review_rows():
+        for index, user_id in enumerate(user_ids):
+            for _ in range(reviews_per_user):
+                yield {
+                    "user_id": user_id,
+                    "reviewer_name": f"Bench{index}",
+                    "rating": rng.randint(1, 5),
+                    "comment": rng.choice(["Prompt pickup", "Friendly crew", "Late again", "Great service"]),
+                }
+
+    SQLModel.metadata.drop_all(engine)
+    SQLModel.metadata.create_all(engine)
+    counts = {}
+    with engine.begin() as connection:
+        for name, model, rows in (
+            ("users", User, user_rows()),
+            ("bookings", Waste, booking_rows()),
+            ("reviews", Review, review_rows()),
+        ):
+            counts[name] = 0
+            for batch in _batches(rows):
+                connection.execute(insert(model), batch)
+                counts[name] += len(batch)
+    return counts
+
+
+def main(url: str, *scale: int) -> None:
+    engine = create_engine(url)
+    started = time.perf_counter()
+    counts = seed(engine, *scale)
+    elapsed = time.perf_counter() - started
+    print(", ".join(f"{count} {name}" for name, count in counts.items()) + f" in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit(__doc__)
+    main(sys.argv[1], *(int(arg) for arg in sys.argv[2:5]))
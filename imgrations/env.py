@@ -21,6 +21,10 @@ if config.config_file_name is not None:
 # target_metadata = mymodel.Base.metadata
 target_metadata = SQLModel.metadata
 from app.models import User,Waste , Review
+from app.config import settings
+from app.db import get_sync_url
+
+config.set_main_option("sqlalchemy.url", get_sync_url(settings.DATABASE_URL))
 
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
@@ -0,0 +1,32 @@
+""" booking and review indexes
+
+Revision ID: 5c1e2f7a9b3d
+Revises: 13adf31ea70e
+Create Date: 2026-10-18 10:12:41.207315
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1e2f7a9b3d'
+down_revision: Union[str, None] = '13adf31ea70e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_review_user_id'), 'review', ['user_id'], unique=False)
+    op.create_index('ix_waste_user_id_pickup_date', 'waste', ['user_id', 'pickup_date'], unique=False)
+    op.create_index('ix_waste_order_status_pickup_date', 'waste', ['order_status', 'pickup_date'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_waste_order_status_pickup_date', table_name='waste')
+    op.drop_index('ix_waste_user_id_pickup_date', table_name='waste')
+    op.drop_index(op.f('ix_review_user_id'), table_name='review')
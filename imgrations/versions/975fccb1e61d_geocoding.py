@@ -0,0 +1,43 @@
+""" geocoding cache and booking coordinates
+
+Revision ID: 975fccb1e61d
+Revises: 8d4b6a0e2c71
+Create Date: 2026-10-18 16:46:41.497941
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+
+# revision identifiers, used by Alembic.
+revision: str = '975fccb1e61d'
+down_revision: Union[str, None] = '8d4b6a0e2c71'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('geocodecache',
+    sa.Column('address', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('latitude', sa.Float(), nullable=True),
+    sa.Column('longitude', sa.Float(), nullable=True),
+    sa.Column('provider', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('address')
+    )
+    op.add_column('waste', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('waste', sa.Column('longitude', sa.Float(), nullable=True))
+    op.add_column('waste', sa.Column('geohash', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+    op.create_index('ix_waste_geohash', 'waste', ['geohash'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_waste_geohash', table_name='waste')
+    op.drop_column('waste', 'geohash')
+    op.drop_column('waste', 'longitude')
+    op.drop_column('waste', 'latitude')
+    op.drop_table('geocodecache')
@@ -1,14 +1,27 @@
+import os
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.main import api_router
 from sqlmodel import SQLModel
-from app.db import engine
+from app.db import engine, async_engine
 from app.config import settings
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import registry
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import PlainTextResponse
+from app.metrics import REGISTRY
+from app.passwords import password_hasher
+from app.images import image_processor
+from app.mailer import outbox_worker
+from app.static import ProfilePictureFiles
+from app.responses import ORJSONResponse
+from app.instrumentation import RequestMetricsMiddleware
+from app.profiling import ProfilingMiddleware
+from app.log import RequestIdMiddleware, configure_logging
+
+configure_logging()
 
-app = FastAPI(title="ZERO WASTE")
+app = FastAPI(title="ZERO WASTE", default_response_class=ORJSONResponse)
 app.include_router(api_router, prefix=settings.API_V1_STR)
 mapper_registry = registry()
 
@@ -19,10 +32,31 @@ app.add_middleware(
     allow_methods=["*"],
    allow_headers=["*"],
 )
+app.add_middleware(RequestMetricsMiddleware)
+app.add_middleware(ProfilingMiddleware)
+# outermost, so everything logged while handling a request carries its id
+app.add_middleware(RequestIdMiddleware)
 
 @app.on_event("startup")
-def on_startup():
+async def on_startup():
     SQLModel.metadata.create_all(engine)
     mapper_registry.configure()
+    outbox_worker.start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await outbox_worker.stop()
+    password_hasher.shutdown()
+    image_processor.shutdown()
+    await async_engine.dispose()
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 
-app.mount("/profile_pictures", StaticFiles(directory="profile_pictures"), name="profile_pictures")
\ No newline at end of file
+# StaticFiles refuses a missing directory, and a fresh checkout has no uploads yet
+os.makedirs(settings.PROFILE_PICTURE_DIR, exist_ok=True)
+app.mount("/profile_pictures", ProfilePictureFiles(directory=settings.PROFILE_PICTURE_DIR), name="profile_pictures")
\ No newline at end of file
@@ -0,0 +1,6 @@
+import os
+
+# app.config needs SMTP settings; the tests never send mail
+for name, value in (("SMTP_HOST", "localhost"), ("SMTP_USER", "test"), ("SMTP_PASSWORD", "test")):
+    os.environ.setdefault(name, value)
+os.environ.setdefault("EMAIL_BACKEND", "console")
@@ -0,0 +1,84 @@
+from urllib.parse import parse_qs, urlparse
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from app.config import settings
+from app.storage import S3Storage
+
+
+BUCKET = "zero-waste-test"
+# the smallest part size S3 accepts, so the multipart tests stay quick
+PART_SIZE = 5 * 1024 * 1024
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setattr(settings, "S3_REGION", "us-east-1")
+    monkeypatch.setattr(settings, "S3_ENDPOINT_URL", None)
+    monkeypatch.setattr(settings, "S3_ACCESS_KEY_ID", "testing")
+    monkeypatch.setattr(settings, "S3_SECRET_ACCESS_KEY", "testing")
+    with mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+@pytest.fixture
+def storage(s3, monkeypatch):
+    monkeypatch.setattr(settings, "S3_MULTIPART_THRESHOLD", PART_SIZE)
+    monkeypatch.setattr(settings, "S3_MULTIPART_CHUNKSIZE", PART_SIZE)
+    return S3Storage(BUCKET, "profile_pictures/")
+
+
+def write_file(directory, name, size):
+    path = directory / name
+    path.write_bytes(b"\xff\xd8\xff" + b"\0" * (size - 3))
+    return path
+
+
+def test_save_uploads_under_prefix_and_removes_local_copy(storage, s3, tmp_path):
+    path = write_file(tmp_path, "picture_64.jpg", 1024)
+
+    key = storage.save(str(path))
+
+    assert key == "profile_pictures/picture_64.jpg"
+    assert not path.exists()
+    head = s3.head_object(Bucket=BUCKET, Key=key)
+    assert head["ContentLength"] == 1024
+    assert head["ContentType"] == "image/jpeg"
+    assert head["CacheControl"] == "public, max-age=31536000, immutable"
+
+
+def test_save_below_threshold_is_a_single_put(storage, s3, tmp_path):
+    key = storage.save(str(write_file(tmp_path, "small.jpg", PART_SIZE - 1)))
+
+    # multipart uploads get an ETag of "<md5 of part md5s>-<part count>"
+    assert "-" not in s3.head_object(Bucket=BUCKET, Key=key)["ETag"]
+
+
+def test_save_above_threshold_is_multipart(storage, s3, tmp_path):
+    key = storage.save(str(write_file(tmp_path, "large.jpg", PART_SIZE * 2 + 1)))
+
+    head = s3.head_object(Bucket=BUCKET, Key=key)
+    assert head["ETag"].strip('"').endswith("-3")
+    assert head["ContentLength"] == PART_SIZE * 2 + 1
+
+
+def test_exists(storage, tmp_path):
+    storage.save(str(write_file(tmp_path, "picture.png", 16)))
+
+    assert storage.exists("picture.png")
+    assert not storage.exists("picture_64.png")
+
+
+def test_url_is_presigned_get_of_the_key(storage):
+    url = urlparse(storage.url("picture_256.jpg"))
+    query = parse_qs(url.query)
+
+    assert url.hostname == f"{BUCKET}.s3.amazonaws.com"
+    assert url.path == "/profile_pictures/picture_256.jpg"
+    assert query["X-Amz-Algorithm"] == ["AWS4-HMAC-SHA256"]
+    assert query["X-Amz-Expires"] == [str(settings.S3_PRESIGN_EXPIRE_SECONDS)]
+    assert "X-Amz-Signature" in query